@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+
+from distinct import per_distinct
+
+# The dimensions of each rollup; every chart reads one of them
+ROLLUP_DIMENSIONS = {
+    "main_category": ["Main Category"],
+    "type_category": ["Type", "Category"],
+    "type_channel": ["Type", "Channel"],
+    "type_month": ["Type", "MonthYear"],
+    "sender": ["Sender"],
+    "recipient": ["Recipient"],
+}
+
+def _party_names(uniques, prefix):
+    names = pd.Series(uniques)
+    return names.where(names.str.startswith(prefix, na=False)).str.replace(rf"^{prefix}\s+", "", regex=True)
+
+def _transfer_party(descriptions, prefix):
+    # Name after "Transfer from"/"Transfer to", read once per distinct description
+    return per_distinct(descriptions, lambda uniques: _party_names(uniques, prefix), np.nan)
+
+def build_rollups(df):
+    """Small totals of ``df`` per ROLLUP_DIMENSIONS entry, built once per statement.
+
+    Each rollup sums TotalKobo (the unsigned amount, in exact kobo) and Count
+    (transactions with an amount); "daily_balance" holds the highest
+    BalanceKobo of each Date as MaxBalanceKobo. Sender and Recipient are the
+    names the transfer charts read from the Description. Missing values are
+    kept as their own groups, so a chart's roll-up matches the same roll-up
+    of ``df``.
+    """
+    frame = df[["MonthYear", "Main Category", "Category", "Channel", "Type"]].assign(
+        Sender=_transfer_party(df["Description"], "Transfer from"),
+        Recipient=_transfer_party(df["Description"], "Transfer to"),
+        TotalKobo=df["AmountKobo"].abs(),
+        Count=df["Amount"].notna().astype("int64"),
+    )
+    rollups = {
+        name: frame.groupby(dimensions, observed=True, dropna=False, sort=False)[["TotalKobo", "Count"]].sum().reset_index()
+        for name, dimensions in ROLLUP_DIMENSIONS.items()
+    }
+    rollups["daily_balance"] = (
+        df.groupby("Date", dropna=False, sort=False)["BalanceKobo"].max().rename("MaxBalanceKobo").reset_index()
+    )
+    return rollups
+
+def build_monthly(type_month, df):
+    """One row per MonthYear, from the "type_month" rollup and the statement, built once per statement.
+
+    InflowKobo/InflowCount total the month's credits and OutflowKobo/
+    OutflowCount its debits; they are <NA> for a month without any.
+    NetKobo is inflow less outflow, and ClosingBalanceKobo the wallet
+    balance after the month's last wallet transaction.
+    """
+    def totals(kind):
+        cells = type_month[type_month["Type"] == kind].groupby("MonthYear")
+        return cells["TotalKobo"].sum(), cells["Count"].sum()
+
+    inflow, inflow_count = totals("Credit")
+    outflow, outflow_count = totals("Debit")
+    monthly = pd.DataFrame({
+        "InflowKobo": inflow,
+        "InflowCount": inflow_count,
+        "OutflowKobo": outflow,
+        "OutflowCount": outflow_count,
+    }).astype("Int64")
+    monthly["NetKobo"] = monthly["InflowKobo"].fillna(0) - monthly["OutflowKobo"].fillna(0)
+    wallet = df[df["Label"] == "Wallet"]
+    monthly["ClosingBalanceKobo"] = wallet.groupby("MonthYear")["BalanceKobo"].last().astype("Int64")
+    return monthly
+
+def dated_between(frame, start, end):
+    """The rows of ``frame`` dated from ``start`` to ``end``, both included."""
+    return frame[(frame["Date"] >= pd.Timestamp(start)) & (frame["Date"] <= pd.Timestamp(end))]
+
+
+class DateRanges:
+    """Totals and rows of any range of value dates, without scanning the statement.
+
+    The statement is kept sorted by Date (ties in Trans Time order) next to
+    prefix sums of its inflow and outflow kobo. A range resolves to a pair of
+    searchsorted offsets: its totals are prefix-sum differences and its rows
+    a slice of the sorted frame.
+    """
+
+    def __init__(self, df):
+        self._sorted_copy = not df["Date"].is_monotonic_increasing
+        self.frame = df.sort_values("Date", kind="stable") if self._sorted_copy else df
+        self.dates = self.frame["Date"].to_numpy()
+        kobo = self.frame["AmountKobo"].to_numpy()
+        self.inflow = np.concatenate([[0], np.cumsum(np.clip(kobo, 0, None))])
+        self.outflow = np.concatenate([[0], np.cumsum(np.clip(-kobo, 0, None))])
+        # Positions of the debits in the sorted frame, rather than a copy of their rows
+        self.debit_positions = np.flatnonzero((self.frame["Outflow"] > 0).to_numpy())
+        self.debit_dates = self.dates[self.debit_positions]
+
+    @property
+    def nbytes(self):
+        # The frame is only counted when it is a sorted copy rather than the statement's own
+        arrays = (self.inflow, self.outflow, self.debit_positions, self.debit_dates)
+        frame = self.frame.memory_usage(deep=True).sum() if self._sorted_copy else 0
+        return int(frame + sum(a.nbytes for a in arrays))
+
+    @staticmethod
+    def _offsets(dates, start, end):
+        start, end = np.datetime64(pd.Timestamp(start)), np.datetime64(pd.Timestamp(end))
+        lo, hi = np.searchsorted(dates, start, side="left"), np.searchsorted(dates, end, side="right")
+        # A start after the end is an empty range, not a negative one
+        return lo, max(hi, lo)
+
+    def totals(self, start, end):
+        """Inflow kobo, outflow kobo and number of transactions dated from ``start`` to ``end``."""
+        lo, hi = self._offsets(self.dates, start, end)
+        return int(self.inflow[hi] - self.inflow[lo]), int(self.outflow[hi] - self.outflow[lo]), int(hi - lo)
+
+    def rows(self, start, end):
+        lo, hi = self._offsets(self.dates, start, end)
+        return self.frame.iloc[lo:hi]
+
+    def debit_rows(self, start, end):
+        """The rows with an outflow, dated from ``start`` to ``end``."""
+        lo, hi = self._offsets(self.debit_dates, start, end)
+        return self.frame.iloc[self.debit_positions[lo:hi]]
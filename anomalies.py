@@ -0,0 +1,612 @@
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+from baselines import Baselines, counterparties
+from cache import LRUCache
+from distinct import per_distinct
+from outliers import OUTLIER_QUANTILE, PATTERN_COLUMNS, PatternModel
+from sketch import QuantileSketch
+
+# OWealth savings movements are left out of the analysis
+EXCLUDED_CATEGORIES = ['OWealth Deposits', 'OWealth Interest']
+
+# Bump when rules or features change, so results cached under the old version are recomputed
+ENGINE_VERSION = 3
+
+HIGH_RISK = "🔴 HIGH RISK"
+UNUSUAL_ACTIVITY = "🟡 UNUSUAL ACTIVITY"
+RISK_LEVELS = [HIGH_RISK, UNUSUAL_ACTIVITY]
+
+# Large transactions this close to each other count as a rapid sequence
+RAPID_WINDOW = pd.Timedelta(minutes=5)
+RAPID_MIN = 3
+
+# Hours from 23:00 to 06:59 count as late night
+LATE_NIGHT_HOURS = (23, 6)
+
+# A day this many times busier than a typical busy day is extreme
+BUSY_DAY_FACTOR = 2
+
+# Payments in whole thousands of naira, this close to each other, form a burst
+ROUND_AMOUNT_KOBO = 1000 * 100
+ROUND_BURST_WINDOW = pd.Timedelta(hours=1)
+ROUND_BURST_MIN = 3
+
+# The same payment to the same counterparty (or through the same channel)
+# again this soon is a possible double debit
+DUPLICATE_WINDOW = pd.Timedelta(minutes=10)
+
+# Fixed charges and top-ups repeat at the same amount by design, so they are
+# never taken for double debits
+FIXED_AMOUNT_CATEGORIES = ['Electronic Money Levy', 'USSD Charges', 'Mobile Data & Airtime']
+
+# Trailing windows of outflow tracked per channel and per category
+VELOCITY_WINDOWS = {"1h": pd.Timedelta(hours=1), "24h": pd.Timedelta(hours=24), "7d": pd.Timedelta(days=7)}
+VELOCITY_KEYS = {"channel": "Channel", "category": "Main Category"}
+
+# Mid-size payments through one channel adding up to more than a top-1%
+# transaction within an hour
+SPEND_BURST_MIN = 3
+
+# Robust z-score above which an amount is far off its counterparty's usual
+BASELINE_Z = 3.5
+
+# Transactions of the whole history the incremental pattern model is fitted
+# on, so refitting costs the same however long the history grows
+PATTERN_SAMPLE_SIZE = 20_000
+
+# Fitted pattern models and baselines, keyed by (statement hash, kind)
+MODEL_CACHE_MAX_BYTES = 16 * 1024 * 1024
+_model_cache = LRUCache(MODEL_CACHE_MAX_BYTES, sizeof=lambda model: model.nbytes)
+
+# Columns of earlier transactions kept for the windowed rules
+WINDOW_COLUMNS = ["Trans Time", "Amount", "AmountKobo", "Type", "Recipient", "Sender", "Channel", "Main Category"]
+HISTORY_WINDOW = max(RAPID_WINDOW, ROUND_BURST_WINDOW, DUPLICATE_WINDOW, *VELOCITY_WINDOWS.values())
+
+def _timestamps(times):
+    return times.to_numpy().astype("datetime64[ns]").view(np.int64)
+
+def _nearby_counts(times, reference, window):
+    """Number of sorted ``reference`` stamps within ``window`` of each row, bounds included."""
+    valid = times.notna().to_numpy()
+    stamps = _timestamps(times)
+    window = window.value
+    counts = (np.searchsorted(reference, stamps + window, side="right")
+              - np.searchsorted(reference, stamps - window, side="left"))
+    return np.where(valid, counts, 0)
+
+def _stamps_where(frame, mask):
+    return np.sort(_timestamps(frame["Trans Time"])[mask & frame["Trans Time"].notna().to_numpy()])
+
+def _seen_before(values, seen):
+    """Whether each of ``values`` is in the set ``seen``, testing each distinct value once."""
+    return per_distinct(values, lambda uniques: np.fromiter((val in seen for val in uniques), dtype=bool, count=len(uniques)),
+                        False)
+
+def _trailing_totals(frame, key, values, windows):
+    """Column sums of ``values`` over each window up to each row, among rows sharing its ``key``.
+
+    Rows are sorted by key and time once; a window's total is then the
+    difference of two prefix sums, with the window start found by
+    searchsorted within the row's group.
+    """
+    codes = pd.factorize(frame[key])[0]
+    codes[frame["Trans Time"].isna().to_numpy()] = -1
+    stamps = _timestamps(frame["Trans Time"])
+    order = np.lexsort((stamps, codes))
+    order = order[codes[order] >= 0]
+    sorted_codes, sorted_stamps = codes[order], stamps[order]
+    prefix = np.vstack([np.zeros(values.shape[1]), np.cumsum(values[order], axis=0)])
+    bounds = np.flatnonzero(np.diff(sorted_codes, prepend=-1, append=-1))
+
+    totals = {}
+    for label, window in windows.items():
+        start = np.empty(len(order), dtype=np.int64)
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            group_stamps = sorted_stamps[lo:hi]
+            start[lo:hi] = lo + np.searchsorted(group_stamps, group_stamps - window.value, side="right")
+        window_totals = np.zeros(values.shape)
+        window_totals[order] = prefix[1:] - prefix[start]
+        totals[label] = window_totals
+    return totals
+
+class Features:
+    """What the rules look at, for the transactions being scored.
+
+    Each feature is computed the first time a rule asks for it, so features
+    no registered rule uses cost nothing. ``earlier`` holds already-scored
+    transactions still inside a rule window, ``daily_counts`` the transaction
+    count of every day seen, ``seen_recipients`` the recipients paid before
+    and ``seen_references`` the references of transactions already scored.
+    Without a fitted ``model`` or ``baselines`` they are fitted on ``df`` itself.
+    """
+
+    def __init__(self, df, q95, q99, q999, daily_counts, earlier=None, seen_recipients=(), seen_references=(),
+                 model=None, baselines=None):
+        self.df = df
+        self.q95 = q95
+        self.q99 = q99
+        self.q999 = q999
+        self.daily_counts = daily_counts
+        self.earlier = earlier
+        self.seen_recipients = seen_recipients
+        self.seen_references = seen_references
+        self._model = model
+        self._baselines = baselines
+
+    def take(self, positions):
+        """The features of the rows at ``positions`` only.
+
+        Features already computed are sliced rather than recomputed, since
+        window and per-day features depend on rows outside the subset.
+        """
+        subset = Features(self.df.iloc[positions], self.q95, self.q99, self.q999, self.daily_counts,
+                          model=self._model, baselines=self._baselines)
+        for name, value in self.__dict__.items():
+            if name in subset.__dict__:
+                continue
+            if isinstance(value, np.ndarray):
+                value = value[positions]
+            elif isinstance(value, pd.DataFrame):
+                value = value.iloc[positions].reset_index(drop=True)
+            subset.__dict__[name] = value
+        return subset
+
+    def _window_frame(self, columns):
+        if self.earlier is None or self.earlier.empty:
+            return self.df[columns]
+        return pd.concat([self.earlier[columns], self.df[columns]], ignore_index=True)
+
+    @cached_property
+    def amount(self):
+        return self.df['Amount'].to_numpy()
+
+    @cached_property
+    def hour(self):
+        return self.df['Hour'].to_numpy()
+
+    @cached_property
+    def is_credit(self):
+        return (self.df['Type'] == 'Credit').to_numpy()
+
+    @cached_property
+    def day_counts(self):
+        # Rows without a date share a day with nobody
+        return self.df['Date'].map(self.daily_counts).fillna(0).to_numpy(dtype=np.int64)
+
+    @cached_property
+    def q95_daily(self):
+        return self.daily_counts.quantile(0.95)
+
+    @cached_property
+    def nearby_large(self):
+        frame = self._window_frame(["Trans Time", "Amount"])
+        large = _stamps_where(frame, frame["Amount"].to_numpy() >= self.q95)
+        return _nearby_counts(self.df['Trans Time'], large, RAPID_WINDOW)
+
+    @cached_property
+    def is_round_payment(self):
+        return self._round_payments(self.df)
+
+    @staticmethod
+    def _round_payments(frame):
+        kobo = frame["AmountKobo"].to_numpy()
+        return (kobo != 0) & (kobo % ROUND_AMOUNT_KOBO == 0) & (frame["Type"] == "Debit").to_numpy()
+
+    @cached_property
+    def nearby_round(self):
+        frame = self._window_frame(["Trans Time", "AmountKobo", "Type"])
+        round_payments = _stamps_where(frame, self._round_payments(frame))
+        return _nearby_counts(self.df['Trans Time'], round_payments, ROUND_BURST_WINDOW)
+
+    @cached_property
+    def repeat_of(self):
+        """Trans Time of an earlier payment this one repeats within DUPLICATE_WINDOW, else NaT.
+
+        Payments are keyed by a hash of amount and counterparty (the channel
+        when there is none) and sorted by key and time, so a repeat is always
+        next to the payment it repeats. FIXED_AMOUNT_CATEGORIES are left out.
+        """
+        frame = self._window_frame(["Trans Time", "AmountKobo", "Type", "Recipient", "Sender", "Channel", "Main Category"])
+        party = counterparties(frame).fillna(frame["Channel"].astype(object))
+        keys = pd.util.hash_pandas_object(pd.DataFrame({"amount": frame["AmountKobo"], "party": party}),
+                                          index=False).to_numpy()
+        stamps = _timestamps(frame["Trans Time"])
+        payment = ((frame["Type"] == "Debit") & frame["Trans Time"].notna()
+                   & ~frame["Main Category"].isin(FIXED_AMOUNT_CATEGORIES)).to_numpy() & (frame["AmountKobo"].to_numpy() != 0)
+
+        rows = np.flatnonzero(payment)
+        rows = rows[np.lexsort((stamps[rows], keys[rows]))]
+        repeat = (keys[rows[1:]] == keys[rows[:-1]]) & (stamps[rows[1:]] - stamps[rows[:-1]] <= DUPLICATE_WINDOW.value)
+        previous = np.full(len(frame), np.datetime64("NaT"), dtype="datetime64[ns]")
+        previous[rows[1:][repeat]] = stamps[rows[:-1][repeat]].astype("datetime64[ns]")
+        return previous[len(frame) - len(self.df):]
+
+    @cached_property
+    def repeated_reference(self):
+        reference = self.df['Reference']
+        return (reference.notna() & (reference.duplicated() | _seen_before(reference, self.seen_references))).to_numpy()
+
+    @cached_property
+    def velocity(self):
+        """Outflow (in kobo) and number of payments per channel and per category over each trailing window."""
+        frame = self._window_frame(["Trans Time", "AmountKobo", "Type", "Channel", "Main Category"])
+        payment = (frame["Type"] == "Debit").to_numpy()
+        values = np.column_stack([np.where(payment, -frame["AmountKobo"].to_numpy(), 0), payment]).astype(float)
+        columns = {}
+        for name, key in VELOCITY_KEYS.items():
+            for label, totals in _trailing_totals(frame, key, values, VELOCITY_WINDOWS).items():
+                totals = totals[len(frame) - len(self.df):]
+                columns[f"{name}_outflow_{label}"] = totals[:, 0]
+                columns[f"{name}_payments_{label}"] = totals[:, 1].astype(np.int64)
+        return pd.DataFrame(columns)
+
+    @cached_property
+    def fast_channel_spend(self):
+        """Mid-size payments through a channel whose last hour of outflow reaches a top-1% transaction."""
+        channel_outflow = self.velocity["channel_outflow_1h"].to_numpy() / 100
+        return ((self.df['Type'] == 'Debit').to_numpy() & (self.amount < self.q95) & (channel_outflow >= self.q99))
+
+    @cached_property
+    def model(self):
+        return self._model if self._model is not None else PatternModel.fit(self.df)
+
+    @cached_property
+    def pattern_distance(self):
+        return self.model.distances(self.df)
+
+    @cached_property
+    def pattern_rank(self):
+        return self.model.ranks(self.pattern_distance)
+
+    @cached_property
+    def baselines(self):
+        return self._baselines if self._baselines is not None else Baselines.fit(self.df)
+
+    @cached_property
+    def baseline(self):
+        return self.baselines.scores(self.df)
+
+    @cached_property
+    def baseline_z(self):
+        return self.baseline["z"].to_numpy()
+
+    @cached_property
+    def new_recipient(self):
+        recipient = self.df['Recipient']
+        first = recipient.notna() & ~recipient.duplicated()
+        return (first & ~_seen_before(recipient, self.seen_recipients)).to_numpy()
+
+
+class Rule:
+    """A named anomaly rule.
+
+    ``when`` maps Features and the rule's ``threshold`` to a boolean mask over
+    the scored rows, so a rule is retuned by changing its threshold alone.
+    ``flag`` (a string, or a function of the features and a row position) and
+    ``reason`` describe a hit. A hit on any HIGH_RISK rule makes the
+    transaction high risk; other hits make it unusual.
+    """
+
+    def __init__(self, name, when, flag, reason, risk_level=UNUSUAL_ACTIVITY, threshold=None):
+        self.name = name
+        self.when = when
+        self.flag = flag
+        self.reason = reason
+        self.risk_level = risk_level
+        self.threshold = threshold
+
+    def mask(self, features):
+        return np.asarray(self.when(features, self.threshold), dtype=bool)
+
+    def describe(self, features, pos):
+        flag = self.flag if isinstance(self.flag, str) else self.flag(features, pos)
+        return flag, self.reason(features, pos)
+
+
+class AnomalyResult:
+    """Flagged transactions, one row each, as columns.
+
+    ``table`` is indexed by the transaction's label in the analysed frame and
+    holds the bitmask of rules hit (bit i is ``rules[i]``), the risk level,
+    the risk score and the amount, so filtering and ranking stay vectorized.
+    Flag and reason text is only produced by ``describe``, for the
+    transactions actually shown.
+    """
+
+    def __init__(self, table, rules, features):
+        self.table = table
+        self.rules = rules
+        self.features = features
+
+    def __len__(self):
+        return len(self.table)
+
+    def hits(self, name):
+        """Mask over ``table`` of the transactions the rule called ``name`` flagged."""
+        names = [rule.name for rule in self.rules]
+        if name not in names:
+            return np.zeros(len(self.table), dtype=bool)
+        return (self.table['flags'].to_numpy() >> names.index(name) & 1).astype(bool)
+
+    def describe(self, label):
+        """Flags and reasons of the flagged transaction with index ``label``."""
+        pos = self.table.index.get_loc(label)
+        bits = int(self.table['flags'].iat[pos])
+        descriptions = [rule.describe(self.features, pos) for i, rule in enumerate(self.rules) if bits >> i & 1]
+        return [flag for flag, _ in descriptions], [reason for _, reason in descriptions]
+
+
+def _direction(features, pos):
+    return "deposit" if features.is_credit[pos] else "payment"
+
+def _duplicate_reason(features, pos):
+    if features.repeated_reference[pos]:
+        return f"Reference {features.df['Reference'].iat[pos]} appears more than once - you may have been charged twice"
+    earlier = pd.Timestamp(features.repeat_of[pos])
+    return f"Same payment of ₦{features.amount[pos]:,.2f} as at {earlier:%H:%M:%S} - you may have been charged twice"
+
+def _burst_reason(features, pos):
+    velocity = features.velocity
+    return (f"{velocity['channel_payments_1h'].iat[pos]} {features.df['Channel'].iat[pos]} payments totalling "
+            f"₦{velocity['channel_outflow_1h'].iat[pos] / 100:,.2f} within an hour - together more than a top 1% "
+            f"transaction (₦{velocity['channel_outflow_24h'].iat[pos] / 100:,.2f} in the last 24 hours)")
+
+def _baseline_name(features, pos):
+    if features.baseline['own'].iat[pos]:
+        row = features.df.iloc[pos]
+        return row['Recipient'] if pd.notna(row['Recipient']) else row['Sender']
+    return features.df['Main Category'].iat[pos]
+
+RULES = [
+    # 1. Extremely large amounts: top 0.1% is high risk, top 1% unusual
+    Rule(
+        "massive_amount",
+        when=lambda f, _: f.amount >= f.q999,
+        flag=lambda f, pos: "🚨 Massive Deposit" if f.is_credit[pos] else "🚨 Massive Payment",
+        reason=lambda f, pos: f"Extremely large {_direction(f, pos)} of ₦{f.amount[pos]:,.2f} - this is in the top 0.1% of all your transactions",
+        risk_level=HIGH_RISK,
+    ),
+    Rule(
+        "very_large_amount",
+        when=lambda f, _: ~(f.amount >= f.q999) & (f.amount >= f.q99),
+        flag=lambda f, pos: "💰 Very Large Deposit" if f.is_credit[pos] else "💰 Very Large Payment",
+        reason=lambda f, pos: f"Very large {_direction(f, pos)} of ₦{f.amount[pos]:,.2f} - this is in the top 1% of your transactions",
+    ),
+    # 2. Very late night large transactions (11 PM - 6 AM)
+    Rule(
+        "late_night_large",
+        when=lambda f, hours: ((f.hour >= hours[0]) | (f.hour <= hours[1])) & (f.amount >= f.q95),
+        flag="🌙 Late Night Large Transaction",
+        reason=lambda f, pos: f"Large transaction (₦{f.amount[pos]:,.2f}) at {f.hour[pos]:02d}:00 - unusual time for significant financial activity",
+        threshold=LATE_NIGHT_HOURS,
+    ),
+    # 3. Days with at least twice the transactions of a typical busy day
+    Rule(
+        "extreme_daily_activity",
+        when=lambda f, factor: f.day_counts >= f.q95_daily * factor,
+        flag="🔄 Extremely High Activity",
+        reason=lambda f, pos: f"{f.day_counts[pos]} transactions on this day - much higher than your typical busy day",
+        threshold=BUSY_DAY_FACTOR,
+    ),
+    # 4. More than two large transactions within five minutes
+    Rule(
+        "rapid_large",
+        when=lambda f, count: f.nearby_large >= count,
+        flag="⚡ Rapid Large Transactions",
+        reason=lambda f, pos: "Multiple large transactions within 5 minutes",
+        threshold=RAPID_MIN,
+    ),
+    # 5. Unlike the user's usual transactions across amount, timing, channel,
+    #    category and counterparty taken together
+    Rule(
+        "unusual_pattern",
+        when=lambda f, quantile: f.pattern_distance >= f.model.distance_at(quantile),
+        flag="🧠 Unusual Pattern",
+        reason=lambda f, pos: f"Unusual combination of amount, time, channel and category for you - more unusual than {f.pattern_rank[pos]:.1%} of your transactions",
+        threshold=OUTLIER_QUANTILE,
+    ),
+    # 6. Far above what the user usually moves with this counterparty, or in
+    #    this category when the counterparty is new or rare
+    Rule(
+        "unusual_for_counterparty",
+        when=lambda f, z: f.baseline_z >= z,
+        flag=lambda f, pos: "👤 Unusual For This Counterparty" if f.baseline['own'].iat[pos] else "📊 Unusual For This Category",
+        reason=lambda f, pos: f"₦{f.amount[pos]:,.2f} is far above your usual ₦{f.baseline['typical_amount'].iat[pos]:,.2f} with {_baseline_name(f, pos)}, usually around {f.baseline['typical_hour'].iat[pos]:02.0f}:00",
+        threshold=BASELINE_Z,
+    ),
+    # 7. Possible double debits: the same payment again within minutes, or a
+    #    reference seen before
+    Rule(
+        "possible_duplicate",
+        when=lambda f, _: ~np.isnat(f.repeat_of) | f.repeated_reference,
+        flag="👯 Possible Duplicate",
+        reason=_duplicate_reason,
+    ),
+    # 8. Many mid-size payments through one channel that add up fast
+    Rule(
+        "spend_burst",
+        when=lambda f, count: f.fast_channel_spend & (f.velocity["channel_payments_1h"].to_numpy() >= count),
+        flag="🔥 Spend Burst",
+        reason=_burst_reason,
+        threshold=SPEND_BURST_MIN,
+    ),
+]
+
+# Not registered by default; add them with RULES.extend(EXTRA_RULES)
+EXTRA_RULES = [
+    Rule(
+        "new_recipient_large_transfer",
+        when=lambda f, _: f.new_recipient & (f.amount >= f.q95),
+        flag="🆕 Large Transfer to New Recipient",
+        reason=lambda f, pos: f"First transfer to {f.df['Recipient'].iloc[pos]} is ₦{f.amount[pos]:,.2f} - larger than 95% of your transactions",
+    ),
+    Rule(
+        "round_amount_burst",
+        when=lambda f, count: f.is_round_payment & (f.nearby_round >= count),
+        flag="🎯 Round Amount Burst",
+        reason=lambda f, pos: f"{f.nearby_round[pos]} round-amount payments within an hour of each other",
+        threshold=ROUND_BURST_MIN,
+    ),
+]
+
+def rules_key(rules=None):
+    """Names and thresholds of ``rules`` (RULES by default), for keying cached results."""
+    return tuple((rule.name, rule.threshold) for rule in (RULES if rules is None else rules))
+
+def _flag_transactions(features, rules):
+    """Evaluate every rule as a column mask over the scored rows."""
+    n = len(features.df)
+    hits = np.array([rule.mask(features) for rule in rules]).reshape(len(rules), n)
+    high = hits[[rule.risk_level == HIGH_RISK for rule in rules]].any(axis=0)
+    risk_score = hits.sum(axis=0) + np.where(high, 2, 1)
+    bitmask = (hits.astype(np.int64) << np.arange(len(rules), dtype=np.int64)[:, None]).sum(axis=0)
+
+    flagged = np.flatnonzero(hits.any(axis=0))
+    table = pd.DataFrame({
+        'flags': bitmask[flagged],
+        'risk_level': pd.Categorical(np.where(high[flagged], HIGH_RISK, UNUSUAL_ACTIVITY), categories=RISK_LEVELS),
+        'risk_score': risk_score[flagged],
+        'Amount': features.amount[flagged],
+    }, index=features.df.index[flagged])
+    return AnomalyResult(table, rules, features.take(flagged))
+
+def _analysed(df):
+    return df[~df['Main Category'].isin(EXCLUDED_CATEGORIES)]
+
+def pattern_model(file_hash, df):
+    """The PatternModel of a statement's analysed transactions, fitted once per statement."""
+    return _model_cache.get_or_create((file_hash, "pattern"), lambda: PatternModel.fit(_analysed(df)))
+
+def counterparty_baselines(file_hash, df):
+    """The Baselines of a statement's analysed transactions, computed once per statement."""
+    return _model_cache.get_or_create((file_hash, "baselines"), lambda: Baselines.fit(_analysed(df)))
+
+def detect_anomalies(df, rules=None, model=None, baselines=None):
+    """Focused anomaly detection - only genuine security concerns.
+
+    Every rule in ``rules`` (RULES by default) is evaluated column-wise over
+    the whole statement; ``model`` and ``baselines`` are the statement's
+    fitted PatternModel and Baselines, fitted here when not given. Returns an AnomalyResult, the user's
+    spending profile (with the number of transactions scored) and the number
+    of rows left out of the analysis.
+    """
+    df_clean = _analysed(df)
+
+    # Calculate dynamic thresholds based on actual data
+    amounts = df_clean['Amount']
+    q95 = amounts.quantile(0.95)  # Top 5%
+    q99 = amounts.quantile(0.99)  # Top 1%
+    q999 = amounts.quantile(0.999)  # Top 0.1%
+
+    user_patterns = {
+        'scored_transactions': len(df_clean),
+        'total_transactions': len(df_clean),
+        'max_single_transaction': amounts.max(),
+        'data_span_days': (df_clean['Trans Time'].max() - df_clean['Trans Time'].min()).days,
+        'median_amount': amounts.median(),
+        'q95_threshold': q95,
+        'q99_threshold': q99,
+        'q999_threshold': q999
+    }
+
+    features = Features(df_clean, q95, q99, q999, daily_counts=df_clean.groupby('Date').size(),
+                        model=model, baselines=baselines)
+    result = _flag_transactions(features, RULES if rules is None else rules)
+    return result, user_patterns, len(df) - len(df_clean)
+
+
+class AnomalyHistory:
+    """Running anomaly state across statements uploaded one after another.
+
+    Amount thresholds come from a mergeable quantile sketch and busy days
+    from per-day counters, so scoring a statement costs time in proportion
+    to that statement rather than to everything seen before. Each statement
+    is scored against the history including itself and then folded in.
+    Transactions at or before the watermark (the latest Trans Time already
+    seen) are skipped, so overlapping statements are not scored twice.
+    The pattern model is refitted with every statement on a uniform sample
+    of up to PATTERN_SAMPLE_SIZE transactions from the whole history, and
+    counterparty baselines are updated with every statement.
+    """
+
+    def __init__(self, k=2048, rules=None):
+        self.rules = rules
+        self.amounts = QuantileSketch(k)
+        self.daily_counts = pd.Series(dtype="int64")
+        self.seen_recipients = set()
+        self.seen_references = set()
+        self.total_transactions = 0
+        self.max_amount = np.nan
+        self.first_seen = None
+        self.watermark = None
+        self.model = None
+        # Each transaction gets a random key and the sample keeps the smallest
+        # keys, which is a uniform sample of everything folded in so far
+        self.pattern_sample = None
+        self.sample_keys = np.empty(0)
+        self._rng = np.random.default_rng(0)
+        self.baselines = Baselines()
+        # Transactions near the watermark, still inside the next statement's rule windows
+        self.recent = None
+
+    def _fold_into_sample(self, df):
+        new = df[PATTERN_COLUMNS]
+        keys = np.concatenate([self.sample_keys, self._rng.random(len(new))])
+        sample = new if self.pattern_sample is None else pd.concat([self.pattern_sample, new])
+        if len(keys) > PATTERN_SAMPLE_SIZE:
+            keep = np.sort(np.argpartition(keys, PATTERN_SAMPLE_SIZE - 1)[:PATTERN_SAMPLE_SIZE])
+            sample, keys = sample.iloc[keep], keys[keep]
+        self.pattern_sample, self.sample_keys = sample, keys
+
+    def score(self, df):
+        """Score the new transactions of ``df``; returns the same triple as detect_anomalies.
+
+        Only transactions after the watermark count as scored.
+        """
+        df_clean = _analysed(df)
+        excluded_count = len(df) - len(df_clean)
+        if self.watermark is not None:
+            df_clean = df_clean[df_clean['Trans Time'] > self.watermark]
+        amounts = df_clean['Amount']
+        times = df_clean['Trans Time']
+
+        sketch = self.amounts.copy()
+        sketch.update(amounts)
+        q95, q99, q999 = (sketch.quantile(q) for q in (0.95, 0.99, 0.999))
+        daily_counts = self.daily_counts.add(df_clean.groupby('Date').size(), fill_value=0).astype("int64")
+
+        self._fold_into_sample(df_clean)
+        self.model = PatternModel.fit(self.pattern_sample)
+        self.baselines.update(df_clean)
+        features = Features(df_clean, q95, q99, q999, daily_counts, self.recent, self.seen_recipients,
+                            self.seen_references, self.model, self.baselines)
+        result = _flag_transactions(features, RULES if self.rules is None else self.rules)
+
+        self.amounts = sketch
+        self.daily_counts = daily_counts
+        self.seen_recipients.update(df_clean['Recipient'].dropna().unique())
+        self.seen_references.update(df_clean['Reference'].dropna().unique())
+        self.total_transactions += len(df_clean)
+        if amounts.notna().any():
+            self.max_amount = np.nanmax([self.max_amount, amounts.max()])
+        if times.notna().any():
+            self.first_seen = times.min() if self.first_seen is None else min(self.first_seen, times.min())
+            self.watermark = times.max() if self.watermark is None else max(self.watermark, times.max())
+            recent = features._window_frame(WINDOW_COLUMNS)
+            self.recent = recent[recent["Trans Time"] >= self.watermark - HISTORY_WINDOW]
+
+        span = self.watermark - self.first_seen if self.watermark is not None else pd.NaT
+        user_patterns = {
+            'scored_transactions': len(df_clean),
+            'total_transactions': self.total_transactions,
+            'max_single_transaction': self.max_amount,
+            'data_span_days': span.days,
+            'median_amount': sketch.quantile(0.5),
+            'q95_threshold': q95,
+            'q99_threshold': q99,
+            'q999_threshold': q999
+        }
+        return result, user_patterns, excluded_count
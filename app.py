@@ -1,9 +1,7 @@
+import html
+
 import streamlit as st
-import fitz
-from datetime import datetime
-import re
 import pandas as pd
-import io
 from streamlit_option_menu import option_menu
 import plotly.express as px
 import numpy as np
@@ -21,8 +19,13 @@ from plots import (
         plot_monthly_outflow_and_count,
         plot_transfer_to_recipients,
         balance_trend_chart,
-        create_sparkline
+        create_sparkline,
+        cached_figure
         )
+from statement import forget_statements, process_statement, statement_hash, to_naira
+from store import statement_store
+from export import EXPORT_FORMATS, export_statement
+from anomalies import ENGINE_VERSION, HIGH_RISK, UNUSUAL_ACTIVITY, AnomalyHistory, counterparty_baselines, detect_anomalies, pattern_model, rules_key
 
 st.set_page_config(
     page_title="Finsight ",
@@ -38,6 +41,12 @@ if 'df' not in st.session_state:
     st.session_state.df = None
 if 'full_df' not in st.session_state:
     st.session_state.full_df = None
+if 'rollups' not in st.session_state:
+    st.session_state.rollups = None
+if 'monthly' not in st.session_state:
+    st.session_state.monthly = None
+if 'date_ranges' not in st.session_state:
+    st.session_state.date_ranges = None
 if 'wallet_df' not in st.session_state:
     st.session_state.wallet_df = None
 if 'owealth_df' not in st.session_state:
@@ -63,6 +72,11 @@ with st.sidebar:
     
     st.sidebar.success("Select a Page above")
     st.sidebar.caption("We prioritize your privacy - no data is collected or processed externally")
+    if statement_store is not None:
+        st.sidebar.caption(f"Parsed statements are saved on this computer only ({statement_store.nbytes / 1024 ** 2:,.1f} MB)")
+        if st.sidebar.button("Forget saved statements"):
+            forget_statements()
+            st.sidebar.success("Saved statements deleted")
     
     # Social links in sidebar
     st.sidebar.markdown("### Connect with us")
@@ -72,167 +86,44 @@ with st.sidebar:
     st.sidebar.markdown("---")
     st.sidebar.caption("Version 1.1.0")
 
-category_mappings = {
-    "Mobile Data & Airtime": ["Mobile Data", "Airtime"],
-    "Card Payments": ["OPay Card Payment"],
-    "USSD Deposits": ["Add Money Bank USSD"],
-    "Bank Deposits": ["Bank Deposit", "^Transfer from(?! EaseMoni)"],
-    "Outgoing Transfers": ["^Transfer to"],
-    "TV Subscriptions": ["TV"],
-    "Electricity Bills": ["Electricity"],
-    "ATM": ["^ATM"],
-    "POS Transactions": ["^POS"],
-    "Loan Repayment": ["MerchantLoan repayment", "EaseMoni loan repayment"],
-    "OWealth Deposits": ["OWealth Deposit", "OWealth Deposit(AutoSave)", "OWealth Deposit(from Fixed)"],
-    "Fixed Deposits": ["Fixed Deposit"],
-    "OPay Card Rewards": ["Apply OPay Physical Card"],
-    "Online Payments": ["^Transfer to Paystack", "Merchant Consumption"],
-    "Others": ["Other", "Certpay"],
-    "Refunds": ["Refund"],
-    "Betting": ["Betting"],
-    "USSD Charges": ["USSD Charge"],
-    "EaseMoni Loans": ["Transfer from EaseMoni"],
-    "OWealth Interest": ["OWealth Interest Earned"],
-    "Electronic Money Levy": ["Electronic Money Transfer Levy"]
-}
-
-def categorize_description(description):
-    if not isinstance(description, str):
-        return "Others"
-    
-    for category, keywords in category_mappings.items():
-        for keyword in keywords:
-            if keyword.startswith("^"):
-                pattern = re.escape(keyword[1:])
-                if re.match(rf"^{pattern}", description, re.IGNORECASE):
-                    return category
-            else:
-                if keyword.lower() in description.lower():
-                    return category
-    return "Others"
-
-# Function to parse data to DataFrame
-def parse_data(data):
-        # Collect errors
-        fix = []
-
-        # Track error row number
-        row = 0
-
-        # Store transaction data in dictionary
-        x = {
-            1: [],
-            2: [],
-            3: [],
-            4: [],
-            5: [],
-            6: [],
-            7: []
-        }
-
-        counter = 1
-
-        for val in data:
-            if row != 0:
-                val = val.strip()
-                if (len(val) == 2 and val.isdigit()):
-                    fix.append((row, val))
-                    continue
-
-                if counter == 2:
-                    try:
-                        datetime.strptime(val, "%d %b %Y")
-                    except ValueError:
-                        fix.append((row, val))
-                        continue
-
-                if counter == 4 and not re.fullmatch(r"[+-].*\.\d{2}", val):
-                        fix.append((row, val))
-                        continue
-
-                else:
-                    x[counter].append(val)
-
-            counter += 1
-            if counter > 7:
-                row += 1
-                counter = 1
-
-        for keys in x:
-            if len(x[keys]) != len(x[1]):
-                x[keys] += [None] * (len(x[1]) - len(x[keys]))
-
-
-        df = pd.DataFrame(x)
-        df.columns = [
-                'Trans Time',
-                'Date',
-                'Description',
-                'Amount',
-                'Balance',
-                'Channel',
-                'Reference'
-        ]
-
-        for err in fix:
-            if len(err[1]) == 2:
-                df.iloc[err[0]-1, 0] += str(err[1])
-            else:
-                df.iloc[err[0]-1, 2] += str(err[1])
-
-        del x
-        del fix
-        del row
-
-        return df
-
-def clean_dataframes(df):
-    df = df.copy()
-    df['Trans Time'] = pd.to_datetime(df['Trans Time'])
-    df['Date'] = pd.to_datetime(df['Date']).dt.date
-    df["Type"] = df["Amount"].apply(lambda x: "Debit" if str(x).startswith("-") else "Credit")
-    df['Amount'] = df['Amount'].str.replace(r"[+, -]", "", regex=True).astype(float)
-    df['Balance'] = df['Balance'].str.replace(r"[+, -]", "", regex=True)
-    df['Balance'] = df['Balance'].fillna("0")
-    df['Balance'] = pd.to_numeric(df['Balance'], errors='coerce')
-    df["Year"] = df["Trans Time"].dt.year
-    df["Month"] = df["Trans Time"].dt.month_name()
-    df["MonthYear"] = df["Trans Time"].dt.to_period("M")
-
-    transfer_to_pattern = r"^Transfer to\s+(.*)"
-    transfer_from_pattern = r"^Transfer from\s+(.*)"
-    df["Category"] = df["Description"]
-
-    outgoing_mask = df["Description"].str.extract(transfer_to_pattern, expand=False).notna()
-    df.loc[outgoing_mask, "Category"] = "Outgoing Bank Transfers"
-
-    received_mask = df["Description"].str.extract(transfer_from_pattern, expand=False).notna()
-    df.loc[received_mask, "Category"] = "Received Bank Transfers"
-
-    df.loc[df['Channel'] == 'ATM', 'Description'] = 'ATM'
-    df.loc[df['Channel'] == 'POS', 'Description'] = 'POS'
-
-    df["Main Category"] = df["Description"].apply(categorize_description)
-    
-    df["Recipient"] = df["Description"].str.extract(transfer_to_pattern, expand=False)
-    df["Sender"] = df["Description"].str.extract(transfer_from_pattern, expand=False)
-
-    df["Inflow"] = df.apply(lambda row: row["Amount"] if row["Type"] == "Credit" else 0.0,axis=1)
-    df["Outflow"] = df.apply(lambda row: row["Amount"] if row["Type"] == "Debit" else 0.0,axis=1)
-
-    df = df.query("Description != 'OWealth Withdrawal'")
-
-    df['Hour'] = df['Trans Time'].dt.hour
-    df['Day'] = df['Trans Time'].dt.day
-    df['Weekday'] = df['Trans Time'].dt.weekday
-    df['IsWeekend'] = df['Weekday'].isin([5, 6]).astype(int)
-
-    return df
+RAINBOW_DIVIDER_HTML = '<div style="height: 2px; background: linear-gradient(to right, red, orange, yellow, green, blue, indigo, violet); border-radius: 5px; margin-top: 0.5rem;"></div>'
 
 def rainbow_divider():
-    st.markdown("""
-                <div style="height: 2px; background: linear-gradient(to right, red, orange, yellow, green, blue, indigo, violet); border-radius: 5px; margin-top: 0.5rem;"></div>
-                    """, unsafe_allow_html=True)
+    st.markdown(RAINBOW_DIVIDER_HTML, unsafe_allow_html=True)
+
+# A resource cache: the result holds the rules used to describe it, and is only read.
+# Keyed by the statement's content hash, the engine version and the registered
+# rules with their thresholds; the leading underscore keeps Streamlit from
+# hashing the frame on every visit
+@st.cache_resource(max_entries=8)
+def analyze_transactions(file_hash, engine_version, rules, _df):
+    return detect_anomalies(_df, model=pattern_model(file_hash, _df), baselines=counterparty_baselines(file_hash, _df))
+
+def anomaly_card_html(number, risk_level, row, flags, reasons):
+    """One flagged transaction card, as a single line of HTML so a page of cards can be sent together."""
+    card_class = "risk-high" if "🔴" in risk_level else "risk-medium" if "🟡" in risk_level else "risk-low"
+    risk_color = "#dc2626" if "🔴" in risk_level else "#f59e0b" if "🟡" in risk_level else "#16a34a"
+    tags_html = ''.join([f'<span class="tag">{html.escape(flag)}</span>' for flag in flags])
+    reasons_html = '<br>'.join([f'• {html.escape(reason)}' for reason in reasons])
+    return (
+        f'<div class="{card_class}">'
+        f'<div style="display: flex; justify-content: space-between; align-items: center; margin-bottom: 1rem;">'
+        f'<div><h3 style="margin: 0; color: {risk_color};">{risk_level}</h3>'
+        f'<p style="margin: 0.25rem 0 0 0; font-size: 0.9rem; color: #666;">Transaction #{number}</p></div>'
+        f'<div style="text-align: right;"><h2 style="margin: 0; color: #1f2937;">₦{row["Amount"]:,.2f}</h2>'
+        f'<p style="margin: 0.25rem 0 0 0; font-size: 0.9rem; color: #666;">{row["Trans Time"].strftime("%b %d, %Y %I:%M %p")}</p></div>'
+        f'</div></div>'
+        f'<div class="transaction-details">'
+        f'<p style="margin: 0; font-size: 1rem;"><strong>📝 Description:</strong> {html.escape(str(row.get("Description", "N/A")))}</p>'
+        f'<p style="margin: 0.5rem 0; font-size: 1rem;"><strong>🏷️ Category:</strong> {html.escape(str(row["Main Category"]))} • '
+        f'<strong>🏪 Channel:</strong> {html.escape(str(row.get("Channel", "N/A")))}</p>'
+        f'</div>'
+        f'<div class="transaction-flags">{tags_html}</div>'
+        f'<div class="transaction-reasons">'
+        f'<p style="margin: 0 0 0.5rem 0; font-weight: bold; color: #374151;">🚩 Why this was flagged:</p>{reasons_html}'
+        f'</div>'
+        f'{RAINBOW_DIVIDER_HTML}'
+    )
 
 if app_pages == "Welcome":
     st.markdown("""
@@ -252,7 +143,7 @@ if app_pages == "Welcome":
     if uploaded_file:
         if (uploaded_file.name != st.session_state.get("processed_file_name")):
             keys_to_reset = [
-                "file_bytes", "wallet_info", "owealth_info",
+                "file_bytes", "file_hash", "wallet_info", "owealth_info",
                 "wallet_df", "owealth_df", "df"
             ]
             for key in keys_to_reset:
@@ -261,80 +152,27 @@ if app_pages == "Welcome":
             # Read file bytes once and store
             file_bytes = uploaded_file.read()
             st.session_state.file_bytes = file_bytes
+            st.session_state.file_hash = statement_hash(file_bytes)
             st.session_state.processed_file_name = uploaded_file.name
         else:
             # Use previously stored bytes for processing
             file_bytes = st.session_state.file_bytes
 
         if bank == "Opay":
-            with fitz.open(stream=file_bytes, filetype="pdf") as doc:
-                all_text = ""
-                for page in doc:
-                    all_text += page.get_text()
-
-            data = all_text.split("\n")
-            if "Note: Current Balance includes OWealth Balance which is powered by Blue Ridge Microfinance Bank, and OPay Wallet Balance." in data:
-                # Extract Wallet Info
-                wallet_info = data[:data.index("Note: Current Balance includes OWealth Balance which is powered by Blue Ridge Microfinance Bank, and OPay Wallet Balance.")]
-                wallet_info.remove('Account Statement')
-                wallet_info = dict(zip(wallet_info[::2], wallet_info[1::2]))
-
-                # Extract Wallet Transactions
-                wallet_trans = data[data.index("Trans. Time") : data.index("Summary - OWealth Balance") - 10]
-
-                wallet_df = parse_data(wallet_trans)
-                wallet_df = clean_dataframes(wallet_df)
-                wallet_df["Label"] = ["Wallet"] * len(wallet_df)
-                df = wallet_df
-
-
-                if "Summary - Wallet Balance" in data:
-                    # Extract Owealth Info
-                    owealth_info = data[data.index("Summary - OWealth Balance") - 10 : data.index("Summary - OWealth Balance")]
-                    # Extract Owealth Transactions
-                    owealth_trans = data[data.index("Summary - OWealth Balance")+1:-2]
-                    owealth_df = parse_data(owealth_trans)
-                    owealth_df = clean_dataframes(owealth_df)
-                    owealth_df["Label"] = ["Owealth"] * len(owealth_df)
-                    df = pd.concat([wallet_df, owealth_df], ignore_index=True)
-                    st.session_state.owealth_info = owealth_info
-                    st.session_state.owealth_df = owealth_df
-
+            statement = process_statement(st.session_state.file_hash, file_bytes)
+            if statement is not None:
                 # Store dataframes info in session state
-                st.session_state.wallet_info = wallet_info
-                st.session_state.wallet_df = wallet_df
-                st.session_state.df = df.sort_values("Trans Time")
+                st.session_state.wallet_info = statement["wallet_info"]
+                st.session_state.wallet_df = statement["wallet_df"]
+                if statement["owealth_df"] is not None:
+                    st.session_state.owealth_info = statement["owealth_info"]
+                    st.session_state.owealth_df = statement["owealth_df"]
+                st.session_state.df = statement["df"]
+                st.session_state.rollups = statement["rollups"]
+                st.session_state.date_ranges = statement["date_ranges"]
+                st.session_state.monthly = statement["monthly"]
                 st.session_state.analyzed = True
 
-                buffer = io.BytesIO()
-                with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-                    wallet_df[["Trans Time",
-                              "Date",
-                              "Description",
-                              "Amount",	
-                              "Balance",
-                              "Channel",
-                              "Reference",
-                              "Type"]].to_excel(writer, sheet_name='Wallet Transactions', index=False)
-                    owealth_df[["Trans Time",
-                              "Date",
-                              "Description",
-                              "Amount",	
-                              "Balance",
-                              "Channel",
-                              "Reference",
-                              "Type"]].to_excel(writer, sheet_name='Owealth Transactions', index=False)
-                    df[["Trans Time",
-                              "Date",
-                              "Description",
-                              "Amount",	
-                              "Balance",
-                              "Channel",
-                              "Reference",
-                              "Type"]].to_excel(writer, sheet_name='All Transactions', index=False)
-
-                buffer.seek(0)
-
                 st.markdown("""
                 <div style="background: linear-gradient(135deg, #d1fae5 0%, #a7f3d0 100%); border-left: 6px solid #10b981; border-radius: 12px; padding: 1.5rem; margin: 2rem 0; box-shadow: 0 4px 6px rgba(16, 185, 129, 0.1);">
                     <div style="display: flex; align-items: center; margin-bottom: 0.5rem;">
@@ -347,11 +185,16 @@ if app_pages == "Welcome":
                 </div>
                 """, unsafe_allow_html=True)
 
+                export_format = st.radio("Download format", list(EXPORT_FORMATS), horizontal=True)
+                _, extension, mime = EXPORT_FORMATS[export_format]
+                file_hash = st.session_state.file_hash
+                # The file is only built when the button is clicked, then cached per statement
                 st.download_button(
-                    label="📥 Download Excel (Wallet + Owealth)",
-                    data=buffer,
-                    file_name='wallet_owealth_data.xlsx',
-                    mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+                    label=f"📥 Download {export_format} (Wallet + Owealth)",
+                    data=lambda: export_statement(file_hash, statement, export_format),
+                    file_name=f'wallet_owealth_data.{extension}',
+                    mime=mime,
+                    on_click="ignore"
                 )
 
                 st.markdown("""
@@ -361,7 +204,7 @@ if app_pages == "Welcome":
                         <h4 style="margin: 0; color: #1e40af; font-size: 1.1rem;">Download Your Data</h4>
                     </div>
                     <p style="margin: 0; color: #1d4ed8; font-size: 0.95rem;">
-                        Below is a preview of your processed Bank Statement. You can use the download button above to download your statement in Excel format now.
+                        Below is a preview of your processed Bank Statement. Choose Excel, CSV or Parquet above and use the download button to save your statement.
                     </p>
                 </div>
                 """, unsafe_allow_html=True)
@@ -425,21 +268,22 @@ elif app_pages == "inSight Model":
         st.title("💱 Welcome to your inSight Model ")
         st.subheader("Here's a quick insighful glance at your financial health.")
         st.write("Be sure to use the date filters below to get more insights into your wallet patterns.")
-        min_date = st.session_state.df['Date'].min()
-        max_date = st.session_state.df['Date'].max()
+        min_date = st.session_state.df['Date'].min().date()
+        max_date = st.session_state.df['Date'].max().date()
         start_date = st.date_input("Enter Start Date", value=min_date, min_value=min_date, max_value=max_date)
         end_date = st.date_input("Enter End Date", value=max_date, min_value=min_date, max_value=max_date)
 
-        tab1_df = st.session_state.df[
-                            (st.session_state.df["Date"] >= start_date) 
-                            & (st.session_state.df["Date"] <= end_date)]
+        # Offsets into the date-sorted statement; totals come from prefix sums
+        date_ranges = st.session_state.date_ranges
+        tab1_df = date_ranges.rows(start_date, end_date)
     
 
         if start_date >= end_date:
             st.error("Error: Start date must be before end date.")
 
-        total_inflow = tab1_df["Inflow"].sum()
-        total_outflow = tab1_df["Outflow"].sum()
+        range_inflow, range_outflow, _ = date_ranges.totals(start_date, end_date)
+        total_inflow = to_naira(range_inflow)
+        total_outflow = to_naira(range_outflow)
     
         col1, col2, col3 = st.columns(3)
 
@@ -503,17 +347,18 @@ elif app_pages == "inSight Model":
 
         rainbow_divider()
         
-        fig = inflow_outflow_bar_chart(tab1_df)
+        fig = cached_figure(st.session_state.file_hash, inflow_outflow_bar_chart, date_ranges,
+                            date_range=(start_date, end_date))
         st.plotly_chart(fig, use_container_width=True)
 
         rainbow_divider()
 
 
         # 1. Most Active Spending Day (highest number of debit transactions)
-        debit_df = tab1_df[tab1_df['Outflow'] > 0]
-        debit_df["Date"] = pd.to_datetime(debit_df["Date"])
-        most_active = debit_df['Date'].dt.date.value_counts().idxmax()
-        active_count = debit_df['Date'].dt.date.value_counts().max()
+        debit_df = date_ranges.debit_rows(start_date, end_date)
+        active_days = debit_df['Date'].value_counts()
+        most_active = active_days.idxmax().date()
+        active_count = active_days.max()
 
         # 2. Highest Single Transaction
         max_trans = debit_df.loc[debit_df['Outflow'].idxmax()]
@@ -581,7 +426,7 @@ elif app_pages == "inSight Model":
 
         with col1:
             fixed_deposits = df.query("Description == 'Fixed Deposit'")
-            fixed_deposit_total = fixed_deposits["Amount"].sum()
+            fixed_deposit_total = to_naira(fixed_deposits["AmountKobo"].abs().sum())
             fixed_deposit_count = fixed_deposits.shape[0]
             latest_amount = (fixed_deposits.sort_values(by="Trans Time", ascending=False).iloc[0]["Amount"] if not df.query("Description == 'Fixed Deposit'").empty else 0)
             max_date = fixed_deposits["Trans Time"].max() if fixed_deposit_count > 0 else None
@@ -602,7 +447,7 @@ elif app_pages == "inSight Model":
             owealth_deposit = df.query("Description == 'OWealth Deposit(from Fixed)'")
 
             if not owealth_deposit.empty:
-                total_owealth = owealth_deposit["Amount"].sum()
+                total_owealth = to_naira(owealth_deposit["AmountKobo"].abs().sum())
                 profit_count = owealth_deposit.shape[0]
             else:
                 profit = 0
@@ -625,7 +470,7 @@ elif app_pages == "inSight Model":
         rainbow_divider()
         rainbow_divider()
         
-        fig = plot_main_category_bar(st.session_state.df)
+        fig = cached_figure(st.session_state.file_hash, plot_main_category_bar, st.session_state.rollups["main_category"])
         st.plotly_chart(fig, use_container_width=True)
 
 
@@ -657,28 +502,28 @@ elif app_pages == "Inflow Patterns":
             rainbow_divider()
 
             top_inflow_amount = st.selectbox("Showing Top Inflow categories:", [5, 10, 20, 30, 50], index=1)
-            fig = plot_top_inflow_categories(st.session_state.df, top_n=top_inflow_amount)
+            fig = cached_figure(st.session_state.file_hash, plot_top_inflow_categories, st.session_state.rollups["type_category"], top_n=top_inflow_amount)
             st.plotly_chart(fig, use_container_width=True)
 
             rainbow_divider()
 
             top_inflow_count = st.selectbox("Showing Top Inflow based on Number of Trasactions:", [5, 10, 20, 30, 50, 70], index=1)
-            fig = plot_top_inflow_count(st.session_state.df, top_n=top_inflow_count)
+            fig = cached_figure(st.session_state.file_hash, plot_top_inflow_count, st.session_state.rollups["type_category"], top_n=top_inflow_count)
             st.plotly_chart(fig, use_container_width=True)
 
             rainbow_divider()
 
             top_sender_inflow = st.selectbox("Select Top Senders", [5, 10, 20, 30, 50, 100], index=1)
-            fig = plot_transfer_inflow_from_sender(st.session_state.df, top_n=top_sender_inflow)
+            fig = cached_figure(st.session_state.file_hash, plot_transfer_inflow_from_sender, st.session_state.rollups["sender"], top_n=top_sender_inflow)
             st.plotly_chart(fig, use_container_width=True)
 
             rainbow_divider()
 
-            fig = plot_monthly_inflow_and_count(st.session_state.df)
+            fig = cached_figure(st.session_state.file_hash, plot_monthly_inflow_and_count, st.session_state.monthly)
             st.plotly_chart(fig, use_container_width=True)
 
         
-            avg_inflow_per_month = (st.session_state.df[st.session_state.df["Type"] == "Credit"].groupby("MonthYear")["Amount"].sum()).mean()
+            avg_inflow_per_month = to_naira(st.session_state.monthly["InflowKobo"].astype("float64").mean())
             st.markdown(f"""
                 <div style="background:white; margin-top:1rem; padding:1.5rem; border-radius:1rem; text-align:center;
                             box-shadow: 0 4px 6px rgba(0,0,0,0.1); border: 1px solid #e5e7eb;">
@@ -710,27 +555,23 @@ elif app_pages == "Outflow Patterns":
 
 
             top_cat_n = st.selectbox("Showing Top Outflow streams:", [5, 10, 20, 30, 50], index=1)
-            fig = plot_top_outflow_categories(st.session_state.df, top_n=top_cat_n)
+            fig = cached_figure(st.session_state.file_hash, plot_top_outflow_categories, st.session_state.rollups["type_category"], top_n=top_cat_n)
             st.plotly_chart(fig, use_container_width=True)
 
             rainbow_divider()
 
             rep_top_n = st.selectbox("View Top Outgoing Bank Transfer Recipients", [3, 5, 10, 20, 25], index=1)
-            st.plotly_chart(plot_transfer_to_recipients(st.session_state.df, top_n=rep_top_n))
+            st.plotly_chart(cached_figure(st.session_state.file_hash, plot_transfer_to_recipients, st.session_state.rollups["recipient"], top_n=rep_top_n))
 
             rainbow_divider()
 
-            st.plotly_chart(plot_spending_by_channel(st.session_state.df))
+            st.plotly_chart(cached_figure(st.session_state.file_hash, plot_spending_by_channel, st.session_state.rollups["type_channel"]))
 
             rainbow_divider()
 
-            st.plotly_chart(plot_monthly_outflow_and_count(st.session_state.df))
+            st.plotly_chart(cached_figure(st.session_state.file_hash, plot_monthly_outflow_and_count, st.session_state.monthly))
 
-            avg_outflow_per_month = (
-                st.session_state.df[st.session_state.df["Type"] == "Debit"]
-                .groupby("MonthYear")["Amount"]
-                .sum()
-            ).mean()
+            avg_outflow_per_month = to_naira(st.session_state.monthly["OutflowKobo"].astype("float64").mean())
 
             st.markdown(f"""
                 <div style="background:white; margin-top:1rem; padding:1.5rem; border-radius:1rem; text-align:center;
@@ -743,7 +584,7 @@ elif app_pages == "Outflow Patterns":
 
     
             st.info("Below is a review of your Maximum Held Balance for each day in the statement's period")
-            st.plotly_chart(balance_trend_chart(st.session_state.df))
+            st.plotly_chart(cached_figure(st.session_state.file_hash, balance_trend_chart, st.session_state.rollups["daily_balance"]))
             st.caption("Feel free to zoom in to any of our interactive charts above")
         
             rainbow_divider()
@@ -815,123 +656,41 @@ elif app_pages == "Detected Anomalies":
         </style>
         """, unsafe_allow_html=True)
 
-        @st.cache_data
-        def analyze_transactions(df):
-            """Focused anomaly detection - only genuine security concerns"""
-            # Filter out OWealth transactions
-            excluded_categories = ['OWealth Deposits', 'OWealth Interest']
-            df_clean = df[~df['Main Category'].isin(excluded_categories)].copy()
-            
-            # Calculate dynamic thresholds based on actual data
-            amounts = df_clean['Amount']
-            
-            # Statistical thresholds based on the data itself
-            q95 = amounts.quantile(0.95)  # Top 5%
-            q99 = amounts.quantile(0.99)  # Top 1%
-            q999 = amounts.quantile(0.999)  # Top 0.1%
-            
-            user_patterns = {
-                'total_transactions': len(df_clean),
-                'max_single_transaction': amounts.max(),
-                'data_span_days': (df_clean['Trans Time'].max() - df_clean['Trans Time'].min()).days,
-                'median_amount': amounts.median(),
-                'q95_threshold': q95,
-                'q99_threshold': q99,
-                'q999_threshold': q999
-            }
-            
-            # Store suspicious transactions
-            suspicious = []
-            
-            for idx, row in df_clean.iterrows():
-                flags = []
-                reasons = []
-                risk_level = "🟢 NORMAL"
-                
-                amount = row['Amount']
-                is_credit = row['Type'] == 'Credit'
-                
-                # 1. EXTREMELY large amounts (top 0.1%)
-                if amount >= q999:
-                    if is_credit:
-                        flags.append("🚨 Massive Deposit")
-                        reasons.append(f"Extremely large deposit of ₦{amount:,.2f} - this is in the top 0.1% of all your transactions")
-                    else:
-                        flags.append("🚨 Massive Payment")
-                        reasons.append(f"Extremely large payment of ₦{amount:,.2f} - this is in the top 0.1% of all your transactions")
-                    risk_level = "🔴 HIGH RISK"
-                
-                elif amount >= q99:  # Top 1%
-                    if is_credit:
-                        flags.append("💰 Very Large Deposit")
-                        reasons.append(f"Very large deposit of ₦{amount:,.2f} - this is in the top 1% of your transactions")
-                    else:
-                        flags.append("💰 Very Large Payment")
-                        reasons.append(f"Very large payment of ₦{amount:,.2f} - this is in the top 1% of your transactions")
-                    risk_level = "🟡 UNUSUAL ACTIVITY"
-                
-                # 2. Very late night large transactions (11 PM - 6 AM)
-                is_late_night = (row['Hour'] >= 23) or (row['Hour'] <= 6)
-                if is_late_night and amount >= q95:
-                    flags.append("🌙 Late Night Large Transaction")
-                    reasons.append(f"Large transaction (₦{amount:,.2f}) at {row['Hour']:02d}:00 - unusual time for significant financial activity")
-                    if risk_level == "🟢 NORMAL":
-                        risk_level = "🟡 UNUSUAL ACTIVITY"
-                
-                # 3. Extremely high daily activity
-                same_day = df_clean[df_clean['Date'] == row['Date']]
-                daily_counts = df_clean.groupby('Date').size()
-                q95_daily = daily_counts.quantile(0.95)
-                
-                if len(same_day) >= q95_daily * 2:
-                    flags.append("🔄 Extremely High Activity")
-                    reasons.append(f"{len(same_day)} transactions on this day - much higher than your typical busy day")
-                    if risk_level == "🟢 NORMAL":
-                        risk_level = "🟡 UNUSUAL ACTIVITY"
-                
-                # 4. Rapid sequential large transactions
-                transaction_time = row['Trans Time']
-                nearby_transactions = df_clean[
-                    (df_clean['Trans Time'] >= transaction_time - pd.Timedelta(minutes=5)) &
-                    (df_clean['Trans Time'] <= transaction_time + pd.Timedelta(minutes=5)) &
-                    (df_clean['Amount'] >= q95)
-                ]
-                if len(nearby_transactions) > 2:
-                    flags.append("⚡ Rapid Large Transactions")
-                    reasons.append(f"Multiple large transactions within 5 minutes")
-                    if risk_level == "🟢 NORMAL":
-                        risk_level = "🟡 UNUSUAL ACTIVITY"
-                
-                if flags:
-                    suspicious.append({
-                        'index': idx,
-                        'transaction': row,
-                        'risk_level': risk_level,
-                        'flags': flags,
-                        'reasons': reasons,
-                        'risk_score': len(flags) + (2 if "🔴" in risk_level else 1 if "🟡" in risk_level else 0)
-                    })
-            
-            return suspicious, user_patterns, len(df) - len(df_clean)
+        incremental = st.toggle(
+            "Compare with my earlier uploads",
+            key="incremental_anomalies",
+            help="Keeps running thresholds across the statements you upload in this session and only scores transactions newer than the ones already seen."
+        )
 
-      
         with st.spinner("🔍 Analyzing your transactions for unusual activity..."):
-            suspicious_transactions, patterns, excluded_count = analyze_transactions(st.session_state.df)
+            if incremental:
+                # Each statement is folded into the history once; reruns reuse its result
+                history = st.session_state.setdefault("anomaly_history", AnomalyHistory())
+                scored_hash, scored = st.session_state.get("anomaly_scores", (None, None))
+                if scored_hash != st.session_state.file_hash:
+                    scored = history.score(st.session_state.df)
+                    st.session_state.anomaly_scores = (st.session_state.file_hash, scored)
+                anomaly_results, patterns, _ = scored
+            else:
+                anomaly_results, patterns, _ = analyze_transactions(
+                    st.session_state.file_hash, ENGINE_VERSION, rules_key(), st.session_state.df
+                )
+        flagged = anomaly_results.table
 
         # Summary Statistics
-        total_analyzed = len(st.session_state.df) - excluded_count
-        high_risk = len([t for t in suspicious_transactions if "🔴" in t['risk_level']])
-        medium_risk = len([t for t in suspicious_transactions if "🟡" in t['risk_level']])
-        original_count = len(suspicious_transactions)
+        total_analyzed = patterns['scored_transactions']
+        high_risk = int((flagged['risk_level'] == HIGH_RISK).sum())
+        medium_risk = int((flagged['risk_level'] == UNUSUAL_ACTIVITY).sum())
+        original_count = len(flagged)
 
         
         # Filter control
         st.markdown("### 🔍 Filter the Results below")
-        col1, col2, col3 = st.columns(3)
+        col1, col2, col3, col4 = st.columns(4)
         
         with col1:
             risk_filter = st.selectbox("Risk Level", 
-                ["All", "🔴 High Risk Only", "🟡 Medium Risk Only"],
+                ["All", "🔴 High Risk Only", "🟡 Medium Risk Only", "👯 Possible Duplicates Only"],
                 key="risk_filter")
         
         with col2:
@@ -942,31 +701,41 @@ elif app_pages == "Detected Anomalies":
                 key="amount_filter")
         
         with col3:
-            max_display = st.slider("Max Transactions to Show", 
+            max_display = st.slider("Transactions per Page", 
                 min_value=5, 
                 max_value=100, 
                 value=20,
                 key="max_display")
         
         # Apply filters
-        filtered_transactions = suspicious_transactions.copy()
-        
+        keep = np.ones(len(flagged), dtype=bool)
+
         # Risk level filter
         if risk_filter == "🔴 High Risk Only":
-            filtered_transactions = [t for t in filtered_transactions if "🔴" in t['risk_level']]
+            keep &= (flagged['risk_level'] == HIGH_RISK).to_numpy()
         elif risk_filter == "🟡 Medium Risk Only":
-            filtered_transactions = [t for t in filtered_transactions if "🟡" in t['risk_level']]
+            keep &= (flagged['risk_level'] == UNUSUAL_ACTIVITY).to_numpy()
+        elif risk_filter == "👯 Possible Duplicates Only":
+            keep &= anomaly_results.hits("possible_duplicate")
         
         # Amount filter
         if amount_min > 0:
-            filtered_transactions = [t for t in filtered_transactions if t['transaction']['Amount'] >= amount_min]
-        
-        # Limit display
-        suspicious_transactions = filtered_transactions[:max_display]
+            keep &= (flagged['Amount'] >= amount_min).to_numpy()
         
+        # Highest risk scores first, earliest first among equal scores
+        filtered_transactions = flagged[keep].sort_values('risk_score', ascending=False, kind='stable')
+
+        # Only the page being viewed is described and sent to the browser
+        pages = max(1, -(-len(filtered_transactions) // max_display))
+        if st.session_state.get("anomaly_page", 1) > pages:
+            st.session_state.anomaly_page = pages
+        with col4:
+            page = st.number_input("Page", min_value=1, max_value=pages, step=1, key="anomaly_page")
+        first = (page - 1) * max_display
+        suspicious_transactions = filtered_transactions.iloc[first:first + max_display]
     
         if len(suspicious_transactions) != len(filtered_transactions):
-            st.info(f"📊 Showing {len(suspicious_transactions)} of {len(filtered_transactions):,} total flagged transactions (filtered)")
+            st.info(f"📊 Showing {first + 1}-{first + len(suspicious_transactions)} of {len(filtered_transactions):,} flagged transactions (page {page} of {pages})")
         
         # Summary Cards
         st.markdown("### 📊 Summary")
@@ -1005,77 +774,16 @@ elif app_pages == "Detected Anomalies":
             """, unsafe_allow_html=True)
 
         
-        if suspicious_transactions:
-            st.markdown(f"### 🚨 {len(suspicious_transactions)} transactions need your attention")
+        if not suspicious_transactions.empty:
+            st.markdown(f"### 🚨 {len(filtered_transactions):,} transactions need your attention")
             st.markdown("**Review these transactions...**")
             
-            # Sort by risk score
-            suspicious_transactions.sort(key=lambda x: x['risk_score'], reverse=True)
-            
-            for i, item in enumerate(suspicious_transactions):
-                row = item['transaction']
-                risk_level = item['risk_level']
-                flags = item['flags']
-                reasons = item['reasons']
-                
-                # Card style
-                if "🔴" in risk_level:
-                    card_class = "risk-high"
-                elif "🟡" in risk_level:
-                    card_class = "risk-medium"
-                else:
-                    card_class = "risk-low"
-                
-                
-                with st.container():
-                    # Card headers
-                    st.markdown(f"""
-                    <div class="{card_class}">
-                        <div style="display: flex; justify-content: space-between; align-items: center; margin-bottom: 1rem;">
-                            <div>
-                                <h3 style="margin: 0; color: {'#dc2626' if '🔴' in risk_level else '#f59e0b' if '🟡' in risk_level else '#16a34a'};">
-                                    {risk_level}
-                                </h3>
-                                <p style="margin: 0.25rem 0 0 0; font-size: 0.9rem; color: #666;">
-                                    Transaction #{i+1}
-                                </p>
-                            </div>
-                            <div style="text-align: right;">
-                                <h2 style="margin: 0; color: #1f2937;">₦{row['Amount']:,.2f}</h2>
-                                <p style="margin: 0.25rem 0 0 0; font-size: 0.9rem; color: #666;">
-                                    {row['Trans Time'].strftime('%b %d, %Y %I:%M %p')}
-                                </p>
-                            </div>
-                        </div>
-                    </div>
-                    """, unsafe_allow_html=True)
-                    
-                    # Transaction details
-                    st.markdown(f"""
-                    <div class="transaction-details">
-                        <p style="margin: 0; font-size: 1rem;"><strong>📝 Description:</strong> {row.get('Description', 'N/A')}</p>
-                        <p style="margin: 0.5rem 0; font-size: 1rem;"><strong>🏷️ Category:</strong> {row['Main Category']} • <strong>🏪 Channel:</strong> {row.get('Channel', 'N/A')}</p>
-                    </div>
-                    """, unsafe_allow_html=True)
-                    
-                    # Tags
-                    tags_html = ''.join([f'<span class="tag">{flag}</span>' for flag in flags])
-                    st.markdown(f"""
-                    <div class="transaction-flags">
-                        {tags_html}
-                    </div>
-                    """, unsafe_allow_html=True)
-                    
-                    # Reasons
-                    reasons_html = '<br>'.join([f'• {reason}' for reason in reasons])
-                    st.markdown(f"""
-                    <div class="transaction-reasons">
-                        <p style="margin: 0 0 0.5rem 0; font-weight: bold; color: #374151;">🚩 Why this was flagged:</p>
-                        {reasons_html}
-                    </div>
-                    """, unsafe_allow_html=True)
-                    
-                    rainbow_divider()
+            # The whole page of cards goes out as one block
+            cards = []
+            for number, (idx, risk_level) in enumerate(suspicious_transactions['risk_level'].items(), start=first + 1):
+                flags, reasons = anomaly_results.describe(idx)
+                cards.append(anomaly_card_html(number, risk_level, st.session_state.df.loc[idx], flags, reasons))
+            st.markdown(''.join(cards), unsafe_allow_html=True)
         
         else:
             # In absence of suspicious transactions
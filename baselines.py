@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+
+from distinct import per_distinct
+
+# Each baseline is taken over the key's latest transactions, so it follows
+# changes in the user's habits and stays cheap to update
+BASELINE_WINDOW = 100
+
+# Keys with fewer transactions than this have no baseline of their own
+BASELINE_MIN_TRANSACTIONS = 5
+
+# Smallest spread of log amounts (about 10%): a fixed repeat payment would
+# otherwise make any change to it look extreme
+MIN_SPREAD = 0.1
+
+BASELINE_STATS = ["count", "median", "spread", "hour"]
+
+
+def counterparties(df):
+    """The Recipient of each transaction, or its Sender when there is none."""
+    return df["Recipient"].astype(object).fillna(df["Sender"].astype(object))
+
+
+def _summarise(recent, key):
+    groups = recent.groupby(key, observed=True, sort=False)
+    deviation = (recent["LogAmount"] - groups["LogAmount"].transform("median")).abs()
+    stats = pd.DataFrame({
+        "count": groups.size(),
+        "median": groups["LogAmount"].median(),
+        "spread": (1.4826 * deviation.groupby(recent[key], observed=True, sort=False).median()).clip(lower=MIN_SPREAD),
+        "hour": groups["Hour"].median(),
+    })
+    stats.index = stats.index.astype(object)
+    return stats[stats["count"] >= BASELINE_MIN_TRANSACTIONS]
+
+
+def _lookup(keys, stats):
+    return per_distinct(keys, lambda uniques: stats.reindex(uniques).to_numpy(dtype=float),
+                        np.full(len(BASELINE_STATS), np.nan))
+
+
+class Baselines:
+    """Robust baselines of amount and time of day per counterparty and per Main Category.
+
+    The median and MAD of log amounts and the median hour of each key are
+    taken over its latest BASELINE_WINDOW transactions. ``update`` folds in
+    new transactions and re-summarises only that retained window, so
+    appending a statement doesn't rescan every transaction seen before.
+    """
+
+    def __init__(self):
+        self.recent = None
+        self.by_counterparty = pd.DataFrame(columns=BASELINE_STATS, dtype=float)
+        self.by_category = pd.DataFrame(columns=BASELINE_STATS, dtype=float)
+
+    @classmethod
+    def fit(cls, df):
+        baselines = cls()
+        baselines.update(df)
+        return baselines
+
+    @property
+    def nbytes(self):
+        if self.recent is None:
+            return 0
+        return int(self.recent.memory_usage(deep=True).sum())
+
+    def update(self, df):
+        new = pd.DataFrame({
+            "Counterparty": counterparties(df).to_numpy(),
+            "Main Category": df["Main Category"].astype(object).to_numpy(),
+            "LogAmount": np.log1p(df["Amount"].to_numpy(dtype=float)),
+            "Hour": df["Hour"].to_numpy(dtype=float),
+        })
+        recent = new if self.recent is None else pd.concat([self.recent, new], ignore_index=True)
+        keep = recent.groupby("Counterparty").cumcount(ascending=False) < BASELINE_WINDOW
+        keep |= recent.groupby("Main Category").cumcount(ascending=False) < BASELINE_WINDOW
+        self.recent = recent[keep].reset_index(drop=True)
+        self.by_counterparty = _summarise(self.recent, "Counterparty")
+        self.by_category = _summarise(self.recent, "Main Category")
+
+    def scores(self, df):
+        """Each transaction against its counterparty's baseline, or its category's without one.
+
+        Returns a frame in the row order of ``df``: the robust z-score of the
+        log amount, the typical amount and hour, and whether the baseline is
+        the counterparty's own.
+        """
+        own = _lookup(counterparties(df), self.by_counterparty)
+        has_own = ~np.isnan(own[:, 0])
+        stats = np.where(has_own[:, None], own, _lookup(df["Main Category"], self.by_category))
+        _, median, spread, hour = stats.T
+        log_amount = np.log1p(df["Amount"].to_numpy(dtype=float))
+        return pd.DataFrame({
+            "z": (log_amount - median) / spread,
+            "typical_amount": np.expm1(median),
+            "typical_hour": hour,
+            "own": has_own,
+        })
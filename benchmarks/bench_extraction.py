@@ -0,0 +1,47 @@
+"""Serial vs process-pool page extraction on synthetic statements.
+
+    python benchmarks/bench_extraction.py [--workers N] [--repeat R]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extraction import EXTRACT_WORKERS, iter_page_texts
+from synthetic import statement_pdf
+
+PAGE_COUNTS = [50, 200, 1000]
+
+
+def best_time(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=EXTRACT_WORKERS)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"workers={args.workers}")
+    print(f"{'pages':>6} {'serial (s)':>11} {'parallel (s)':>13} {'speedup':>8}")
+    for pages in PAGE_COUNTS:
+        file_bytes = statement_pdf(pages)
+        serial_texts = list(iter_page_texts(file_bytes, workers=1))
+        parallel_texts = list(iter_page_texts(file_bytes, workers=args.workers, min_pages=0))
+        assert parallel_texts == serial_texts
+
+        serial = best_time(lambda: list(iter_page_texts(file_bytes, workers=1)), args.repeat)
+        parallel = best_time(lambda: list(iter_page_texts(file_bytes, workers=args.workers, min_pages=0)), args.repeat)
+        print(f"{len(serial_texts):>6} {serial:>11.3f} {parallel:>13.3f} {serial / parallel:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Memory footprint of the cleaned transaction frame, old layout vs compact schema.
+
+    python benchmarks/bench_memory.py [--rows N]
+
+The old layout is rebuilt from the compact frame: Python strings in object
+columns, datetime.date objects for Date and 32/64-bit calendar integers.
+"""
+import argparse
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from statement import CATEGORICAL_COLUMNS, clean_dataframes, parse_data
+from synthetic import wallet_lines
+
+LEGACY_INTEGERS = {"Year": "int32", "Hour": "int32", "Day": "int32", "Weekday": "int32", "IsWeekend": "int64"}
+
+
+def legacy_layout(df):
+    df = df.copy()
+    for column in CATEGORICAL_COLUMNS + ["Reference"]:
+        if column in df:
+            df[column] = df[column].astype(object)
+    for column, dtype in LEGACY_INTEGERS.items():
+        df[column] = df[column].astype(dtype)
+    df["Date"] = df["Date"].dt.date
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    compact = clean_dataframes(parse_data(wallet_lines(args.rows)))
+    compact["Label"] = pd.Categorical(["Wallet"] * len(compact))
+    legacy = legacy_layout(compact)
+
+    before = legacy.memory_usage(deep=True)
+    after = compact.memory_usage(deep=True)
+    per_100k = 100_000 / len(compact)
+
+    print(f"{'column':<15} {'before':>12} {'after':>12}")
+    for column in compact.columns:
+        print(f"{column:<15} {before[column] * per_100k / 2**20:>10.2f}MB {after[column] * per_100k / 2**20:>10.2f}MB")
+    print(f"{'total':<15} {before.sum() * per_100k / 2**20:>10.2f}MB {after.sum() * per_100k / 2**20:>10.2f}MB"
+          f"  ({before.sum() / after.sum():.1f}x smaller, per 100k rows)")
+
+
+if __name__ == "__main__":
+    main()
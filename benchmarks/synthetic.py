@@ -0,0 +1,108 @@
+"""Synthetic OPay statements for the benchmarks in this directory.
+
+The text layout mirrors what PyMuPDF extracts from a real OPay statement:
+one field per line, with some transaction times split into a trailing
+two-digit fragment and some descriptions wrapped onto a second line.
+"""
+import random
+import time
+from datetime import datetime, timedelta
+
+import fitz
+
+OPAY_NOTE = "Note: Current Balance includes OWealth Balance which is powered by Blue Ridge Microfinance Bank, and OPay Wallet Balance."
+
+TABLE_HEADER = ["Trans. Time", "Value Date", "Description", "Debit/Credit(NGN)", "Balance After(NGN)", "Channel", "Transaction Reference"]
+
+DESCRIPTIONS = [
+    "Mobile Data", "Airtime", "OPay Card Payment", "Transfer to JOHN DOE", "Transfer to Paystack Ltd",
+    "Transfer from MARY JANE", "Transfer from EaseMoni", "TV Subscription", "Electricity Bill", "Betting",
+    "OWealth Deposit", "OWealth Withdrawal", "Fixed Deposit", "OWealth Deposit(from Fixed)",
+    "Electronic Money Transfer Levy", "USSD Charge", "Refund", "Merchant Consumption", "Certpay",
+    "POS Purchase", "ATM Withdrawal", "OWealth Interest Earned",
+]
+NAMES = ["ADE", "BOLA", "CHIDI", "EMEKA", "FUNKE", "GRACE", "HALIMA", "IBRAHIM"]
+CHANNELS = ["Mobile", "POS", "ATM", "USSD", "Web"]
+
+# Lines of text written on each synthetic PDF page
+LINES_PER_PAGE = 70
+
+
+def transactions(n, seed=0, start=datetime(2023, 1, 1)):
+    rnd = random.Random(seed)
+    when = start
+    balance = 100000.0
+    for _ in range(n):
+        when += timedelta(seconds=rnd.randint(30, 20000))
+        description = rnd.choice(DESCRIPTIONS)
+        if description.startswith("Transfer") and rnd.random() < 0.6:
+            description = f"{description} {rnd.choice(NAMES)}{rnd.randint(1, 40)}"
+        amount = round(rnd.lognormvariate(7, 1.5), 2)
+        credit = description.startswith(("Transfer from", "Refund")) or rnd.random() < 0.2
+        balance += amount if credit else -amount
+        yield (
+            when.strftime("%d %b %Y %H:%M:%S"),
+            when.strftime("%d %b %Y"),
+            description,
+            ("+" if credit else "-") + f"{amount:,.2f}",
+            f"{balance:,.2f}",
+            rnd.choice(CHANNELS),
+            str(rnd.randint(10**17, 10**18)),
+        )
+
+
+def _transaction_lines(transaction, rnd):
+    trans_time, value_date, description, amount, balance, channel, reference = transaction
+    lines = [trans_time[:-2], trans_time[-2:]] if rnd.random() < 0.2 else [trans_time]
+    lines.append(value_date)
+    if " " in description and rnd.random() < 0.15:
+        cut = description.index(" ")
+        lines += [description[:cut], description[cut:]]
+    else:
+        lines.append(description)
+    lines += [amount, balance, channel, reference]
+    return lines
+
+
+def statement_lines(n_wallet, n_owealth, seed=0):
+    rnd = random.Random(seed + 1)
+    lines = [
+        "Account Statement", "Account Name", "JOHN DOE", "Account Number", "8012345678",
+        "Current Balance", "NGN123,456.78", "Credit Count", "42", "Debit Count", "58",
+        OPAY_NOTE, "Summary - Wallet Balance",
+    ]
+    lines += TABLE_HEADER
+    for transaction in transactions(n_wallet, seed):
+        lines += _transaction_lines(transaction, rnd)
+    lines += [f"OWealth summary {i}" for i in range(10)]
+    lines.append("Summary - OWealth Balance")
+    lines += TABLE_HEADER
+    for transaction in transactions(n_owealth, seed + 7):
+        lines += _transaction_lines(transaction, rnd)
+    lines.append("Page footer")
+    return lines
+
+
+def wallet_lines(rows, seed=0):
+    """The wallet table of a synthetic statement with ``rows`` transactions, as parse_data reads it."""
+    lines = statement_lines(rows, 0, seed)
+    return lines[lines.index("Trans. Time"):lines.index("Summary - OWealth Balance") - 10]
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def statement_pdf(pages, seed=0):
+    """Bytes of a synthetic statement spanning roughly ``pages`` pages."""
+    # About 7.3 lines per transaction, a fifth of them in the OWealth table
+    n = int((pages * LINES_PER_PAGE - 50) / 7.3)
+    lines = statement_lines(n - n // 5, n // 5, seed)
+    doc = fitz.open()
+    for start in range(0, len(lines), LINES_PER_PAGE):
+        page = doc.new_page()
+        for i, line in enumerate(lines[start:start + LINES_PER_PAGE]):
+            page.insert_text((20, 20 + 11 * i), line, fontsize=8, fontname="helv")
+    return doc.tobytes()
@@ -0,0 +1,15 @@
+import numpy as np
+import pandas as pd
+
+
+def per_distinct(values, lookup, missing):
+    """``lookup`` run once over the distinct values of ``values``, spread back over every row.
+
+    ``lookup`` gets the distinct non-missing values as an object array and
+    returns one result (or row of results) per value; missing values get
+    ``missing``. Returns a numpy array in the order of ``values``.
+    """
+    codes, uniques = pd.factorize(values)
+    results = np.asarray(lookup(np.asarray(uniques, dtype=object)))
+    # Missing values are coded -1, which picks the appended ``missing``
+    return np.append(results, [missing], axis=0)[codes]
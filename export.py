@@ -0,0 +1,74 @@
+import io
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+
+from cache import LRUCache
+
+EXPORT_COLUMNS = [
+    "Trans Time",
+    "Date",
+    "Description",
+    "Amount",
+    "Balance",
+    "Channel",
+    "Reference",
+    "Type"
+]
+
+# Rows converted to Python values at a time while streaming the workbook
+EXCEL_CHUNK_ROWS = 10_000
+
+# Finished exports, keyed by (statement hash, format)
+EXPORT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+_export_cache = LRUCache(EXPORT_CACHE_MAX_BYTES)
+
+def _export_frame(df):
+    # Value dates are exported as plain dates, without a midnight time
+    return df[EXPORT_COLUMNS].assign(Date=df["Date"].dt.date)
+
+def _write_sheet(workbook, title, df):
+    sheet = workbook.create_sheet(title)
+    header = []
+    for name in EXPORT_COLUMNS:
+        cell = WriteOnlyCell(sheet, value=name)
+        cell.font = Font(bold=True)
+        header.append(cell)
+    sheet.append(header)
+
+    for start in range(0, len(df), EXCEL_CHUNK_ROWS):
+        chunk = _export_frame(df.iloc[start:start + EXCEL_CHUNK_ROWS]).astype(object)
+        for row in chunk.where(chunk.notna(), None).itertuples(index=False, name=None):
+            sheet.append(row)
+
+def build_excel(statement):
+    """Wallet, OWealth and combined sheets, streamed through a write-only workbook."""
+    workbook = Workbook(write_only=True)
+    _write_sheet(workbook, "Wallet Transactions", statement["wallet_df"])
+    if statement["owealth_df"] is not None:
+        _write_sheet(workbook, "Owealth Transactions", statement["owealth_df"])
+    _write_sheet(workbook, "All Transactions", statement["df"])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+def build_csv(statement):
+    """Every transaction once, with a Label column telling wallet and OWealth apart."""
+    return _export_frame(statement["df"]).assign(Label=statement["df"]["Label"]).to_csv(index=False).encode()
+
+def build_parquet(statement):
+    buffer = io.BytesIO()
+    _export_frame(statement["df"]).assign(Label=statement["df"]["Label"]).to_parquet(buffer, index=False)
+    return buffer.getvalue()
+
+EXPORT_FORMATS = {
+    "Excel": (build_excel, "xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "CSV": (build_csv, "csv", "text/csv"),
+    "Parquet": (build_parquet, "parquet", "application/vnd.apache.parquet"),
+}
+
+def export_statement(file_hash, statement, fmt):
+    """Bytes of a statement exported in one of EXPORT_FORMATS, built once per statement."""
+    build = EXPORT_FORMATS[fmt][0]
+    return _export_cache.get_or_create((file_hash, fmt), lambda: build(statement))
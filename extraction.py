@@ -0,0 +1,71 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import fitz
+
+# Worker processes used to extract large statements; 1 always extracts serially
+EXTRACT_WORKERS = int(os.environ.get("FINSIGHT_EXTRACT_WORKERS", os.cpu_count() or 1))
+
+# Below this many pages starting a process pool costs more than it saves
+PARALLEL_MIN_PAGES = 200
+
+# Page ranges handed out per worker, so uneven pages don't leave workers idle
+RANGES_PER_WORKER = 4
+
+# Each worker process opens its own copy of the document once
+_worker_doc = None
+
+def _open_worker_doc(file_bytes):
+    global _worker_doc
+    _worker_doc = fitz.open(stream=file_bytes, filetype="pdf")
+
+def _extract_page_range(page_range):
+    start, stop = page_range
+    return [_worker_doc[i].get_text() for i in range(start, stop)]
+
+def _split_pages(page_count, parts):
+    step = -(-page_count // parts)
+    return [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+
+def iter_page_texts(file_bytes, workers=None, min_pages=PARALLEL_MIN_PAGES):
+    """Yield the text of every page of a PDF, in page order.
+
+    Documents with at least ``min_pages`` pages are split into page ranges
+    extracted by a pool of ``workers`` processes (EXTRACT_WORKERS by default);
+    smaller ones are read serially in this process.
+    """
+    workers = EXTRACT_WORKERS if workers is None else workers
+
+    with fitz.open(stream=file_bytes, filetype="pdf") as doc:
+        page_count = len(doc)
+        if workers <= 1 or page_count < max(min_pages, 2):
+            for page in doc:
+                yield page.get_text()
+            return
+
+    workers = min(workers, page_count)
+    page_ranges = _split_pages(page_count, workers * RANGES_PER_WORKER)
+    # spawn rather than fork: the Streamlit server is multi-threaded
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=get_context("spawn"),
+        initializer=_open_worker_doc,
+        initargs=(file_bytes,),
+    ) as pool:
+        for texts in pool.map(_extract_page_range, page_ranges):
+            yield from texts
+
+def iter_page_lines(page_texts):
+    """Yield the text lines of a PDF page by page.
+
+    Produces exactly the lines of ``"".join(page_texts).split("\\n")`` without
+    ever holding more than one page of text.
+    """
+    carry = ""
+    for text in page_texts:
+        lines = text.split("\n")
+        lines[0] = carry + lines[0]
+        carry = lines.pop()
+        yield from lines
+    yield carry
@@ -0,0 +1,139 @@
+import numpy as np
+
+from distinct import per_distinct
+
+# Categorical features encoded by how rare each value is among the user's
+# transactions; the counterparty is the Recipient or Sender, whichever is set
+FREQUENCY_FEATURES = ["Channel", "Main Category"]
+UNSEEN = "__unseen__"
+NO_COUNTERPARTY = "__none__"
+
+# Share of transactions the robust fit is concentrated on, and refinement steps
+SUPPORT_FRACTION = 0.75
+CONCENTRATION_STEPS = 3
+
+# Transactions further out than this share of the user's own count as outliers
+OUTLIER_QUANTILE = 0.99
+
+# Too few transactions to say what is usual
+MIN_TRANSACTIONS = 50
+
+# Columns the model reads
+PATTERN_COLUMNS = ["Amount", "Hour", "Weekday", "IsWeekend", "Channel", "Main Category", "Recipient", "Sender"]
+
+
+def _counts(values):
+    counts = values.value_counts()
+    counts.index = counts.index.astype(object)
+    return counts[counts > 0]
+
+
+def _rarities(counts, total):
+    """-log share of each value, plus the rarity of a value never seen before."""
+    rarity = -np.log(counts / total)
+    rarity[UNSEEN] = -np.log(1 / (total + 1))
+    return rarity
+
+
+def _rarity_of(values, rarity, missing):
+    return per_distinct(values, lambda uniques: rarity.reindex(uniques).fillna(rarity[UNSEEN]).to_numpy(dtype=float),
+                        missing)
+
+
+def _squared_distances(centered, precision):
+    # Row-wise x^T P x as one matrix product, rather than an einsum over every row
+    return ((centered @ precision) * centered).sum(axis=1)
+
+
+def _cyclic(values, period):
+    angle = 2 * np.pi * np.asarray(values, dtype=float) / period
+    return np.sin(angle), np.cos(angle)
+
+
+class PatternModel:
+    """Robust Mahalanobis model of a user's typical transaction.
+
+    Each transaction becomes a point of log amount, hour and weekday (on a
+    circle), weekend, and the rarity of its channel, category and
+    counterparty. Location and covariance are fitted on the most central
+    SUPPORT_FRACTION of points with a few MCD-style concentration steps, so
+    the outliers being looked for don't distort the fit.
+    """
+
+    def __init__(self, frequencies, center, scale, location, precision, distance_quantiles):
+        self.frequencies = frequencies
+        self.center = center
+        self.scale = scale
+        self.location = location
+        self.precision = precision
+        # Squared distances of the fitted transactions at 0.1% steps
+        self.distance_quantiles = distance_quantiles
+
+    def distance_at(self, quantile=OUTLIER_QUANTILE):
+        """Squared distance below which ``quantile`` of the fitted transactions fall."""
+        return self.distance_quantiles[int(quantile * (len(self.distance_quantiles) - 1))]
+
+    @property
+    def nbytes(self):
+        arrays = (self.center, self.scale, self.location, self.precision, self.distance_quantiles)
+        return sum(a.nbytes for a in arrays) + sum(64 * len(f) for f in self.frequencies.values())
+
+    def _matrix(self, df):
+        amount = df["Amount"].to_numpy(dtype=float)
+        columns = [np.log1p(np.nan_to_num(amount, nan=0.0))]
+        columns += _cyclic(df["Hour"], 24)
+        columns += _cyclic(df["Weekday"], 7)
+        columns.append(df["IsWeekend"].to_numpy(dtype=float))
+        for name in FREQUENCY_FEATURES:
+            rarity = self.frequencies[name]
+            columns.append(_rarity_of(df[name], rarity, rarity[UNSEEN]))
+        rarity = self.frequencies["Counterparty"]
+        recipient = _rarity_of(df["Recipient"], rarity, np.nan)
+        sender = _rarity_of(df["Sender"], rarity, rarity.get(NO_COUNTERPARTY, rarity[UNSEEN]))
+        columns.append(np.where(np.isnan(recipient), sender, recipient))
+        return np.column_stack(columns)
+
+    @classmethod
+    def fit(cls, df):
+        n = len(df)
+        frequencies = {name: _rarities(_counts(df[name]), n) for name in FREQUENCY_FEATURES}
+        counterparties = _counts(df["Recipient"]).add(_counts(df["Sender"].where(df["Recipient"].isna())), fill_value=0)
+        counterparties[NO_COUNTERPARTY] = (df["Recipient"].isna() & df["Sender"].isna()).sum()
+        frequencies["Counterparty"] = _rarities(counterparties, n)
+        model = cls(frequencies, None, None, None, None, None)
+        X = model._matrix(df)
+        d = X.shape[1]
+
+        if n < MIN_TRANSACTIONS:
+            model.center, model.scale = np.zeros(d), np.ones(d)
+            model.location, model.precision = np.zeros(d), np.zeros((d, d))
+            model.distance_quantiles = np.full(1001, np.inf)
+            return model
+
+        model.center = np.median(X, axis=0)
+        mad = 1.4826 * np.median(np.abs(X - model.center), axis=0)
+        std = X.std(axis=0)
+        model.scale = np.where(mad > 0, mad, np.where(std > 0, std, 1.0))
+        Z = (X - model.center) / model.scale
+
+        support = max(int(SUPPORT_FRACTION * n), d + 1)
+        distances = np.square(Z).sum(axis=1)
+        for _ in range(CONCENTRATION_STEPS):
+            core = Z[np.argpartition(distances, support - 1)[:support]]
+            location = core.mean(axis=0)
+            covariance = np.cov(core, rowvar=False) + 1e-6 * np.eye(d)
+            precision = np.linalg.pinv(covariance)
+            distances = _squared_distances(Z - location, precision)
+
+        model.location, model.precision = location, precision
+        model.distance_quantiles = np.quantile(distances, np.linspace(0, 1, 1001))
+        return model
+
+    def distances(self, df):
+        """Squared robust Mahalanobis distance of every transaction in ``df``."""
+        centered = (self._matrix(df) - self.center) / self.scale - self.location
+        return _squared_distances(centered, self.precision)
+
+    def ranks(self, distances):
+        """Share of the fitted transactions closer to the typical one than each distance."""
+        return np.searchsorted(self.distance_quantiles, distances, side="right") / len(self.distance_quantiles)
@@ -1,11 +1,92 @@
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 import pandas as pd
 
-def plot_main_category_bar(df):
+from aggregates import DateRanges, dated_between
+from cache import LRUCache
+
+# Every chart reads one of the statement's small rollups or its monthly
+# table (see aggregates.build_rollups and build_monthly), or the prefix sums
+# of a DateRanges, rather than its transactions. Money totals are exact
+# integer kobo there and converted to naira at the end.
+KOBO_PER_NAIRA = 100
+
+# Built figures, keyed by (statement hash, date range, chart, top_n) and sized
+# by their data arrays. Cached figures are shared and must not be modified.
+FIGURE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+FIGURE_ARRAYS = ["x", "y", "text", "customdata", "hovertext", "labels", "values"]
+# Bytes per array element and per figure (layout and trace settings), about
+# what they take in the figure's JSON
+FIGURE_BYTES_PER_POINT = 24
+FIGURE_BASE_BYTES = 8 * 1024
+
+def _figure_size(fig):
+    points = 0
+    for trace in fig.data:
+        for name in FIGURE_ARRAYS:
+            values = trace[name] if name in trace else None
+            if values is not None and not isinstance(values, str):
+                points += len(values)
+    return FIGURE_BASE_BYTES + FIGURE_BYTES_PER_POINT * points
+
+_figure_cache = LRUCache(FIGURE_CACHE_MAX_BYTES, sizeof=_figure_size)
+
+# Long series are thinned on the server to about one point per horizontal
+# pixel of the chart they are drawn in, and one bar per MIN_BAR_PX
+SPARKLINE_WIDTH_PX = 400
+BALANCE_CHART_WIDTH_PX = 1200
+MIN_BAR_PX = 3
+
+def lttb_indices(x, y, n_out):
+    """Positions of the ``n_out`` points Largest-Triangle-Three-Buckets keeps.
+
+    The first and last points are always kept. Each bucket in between keeps
+    the point forming the largest triangle with the point kept before it and
+    the mean of the next bucket, so peaks and troughs survive the thinning.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.append(np.linspace(1, n - 1, n_out - 1).astype(np.int64), n)
+
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(n_out - 2):
+        lo, hi, next_hi = edges[bucket], edges[bucket + 1], edges[bucket + 2]
+        next_x, next_y = x[hi:next_hi].mean(), y[hi:next_hi].mean()
+        area = np.abs((x[previous] - next_x) * (y[lo:hi] - y[previous])
+                      - (x[previous] - x[lo:hi]) * (next_y - y[previous]))
+        previous = lo + int(np.argmax(area))
+        kept[bucket + 1] = previous
+    return kept
+
+def cached_figure(file_hash, chart, data, top_n=None, date_range=None):
+    """``chart`` of one of a statement's rollups, built once per date range and top_n.
+
+    With a DateRanges as ``data``, the chart gets the range's totals instead.
+    Changing one chart's control then rebuilds only that chart; the others
+    are reused as they are.
+    """
+    def build():
+        if date_range is None:
+            chart_data = data
+        elif isinstance(data, DateRanges):
+            chart_data = data.totals(*date_range)
+        else:
+            chart_data = dated_between(data, *date_range)
+        return chart(chart_data) if top_n is None else chart(chart_data, top_n=top_n)
+    return _figure_cache.get_or_create((file_hash, date_range, chart.__name__, top_n), build)
+
+def plot_main_category_bar(main_category):
     category_summary = (
-        df.groupby("Main Category")["Amount"]
+        main_category.groupby("Main Category", observed=True)["TotalKobo"]
         .sum()
+        .div(KOBO_PER_NAIRA)
+        .rename("Amount")
         .reset_index()
         .sort_values("Amount", ascending=True) 
         )
@@ -39,9 +120,11 @@ def plot_main_category_bar(df):
 
 
 
-def inflow_outflow_bar_chart(df):
-    total_inflow = df["Inflow"].sum()
-    total_outflow = df["Outflow"].sum()
+def inflow_outflow_bar_chart(totals):
+    # Inflow kobo, outflow kobo and transaction count, as DateRanges.totals gives them
+    inflow_kobo, outflow_kobo, _ = totals
+    total_inflow = inflow_kobo / KOBO_PER_NAIRA
+    total_outflow = outflow_kobo / KOBO_PER_NAIRA
     deficit = total_outflow - total_inflow
 
     data = {
@@ -122,12 +205,14 @@ def inflow_outflow_bar_chart(df):
 
     return fig
 
-def plot_top_inflow_categories(df, top_n=10):
-    df = df.query("Type == 'Credit'")
+def plot_top_inflow_categories(type_category, top_n=10):
+    credits = type_category[type_category["Type"] == "Credit"]
 
     grouped = (
-        df.groupby("Category")["Amount"]
+        credits.groupby("Category", observed=True)["TotalKobo"]
         .sum()
+        .div(KOBO_PER_NAIRA)
+        .rename("Amount")
         .reset_index()
         .sort_values(by="Amount", ascending=False)
     )
@@ -166,14 +251,14 @@ def plot_top_inflow_categories(df, top_n=10):
 )
     return fig
 
-def plot_top_inflow_count(df, top_n=10):
-    df = df.query("Type == 'Credit'")
+def plot_top_inflow_count(type_category, top_n=10):
+    credits = type_category[type_category["Type"] == "Credit"]
 
     grouped = (
-        df.groupby("Category")["Amount"]
-        .count()
+        credits.groupby("Category", observed=True)["Count"]
+        .sum()
         .reset_index()
-        .rename(columns={"Amount": "Number of Transactions"})
+        .rename(columns={"Count": "Number of Transactions"})
         .sort_values(by="Number of Transactions", ascending=True)
     )
 
@@ -212,15 +297,14 @@ def plot_top_inflow_count(df, top_n=10):
 
     return fig
 
-def plot_monthly_inflow_and_count(df):
-    df = df[df["Type"] == "Credit"]
+def plot_monthly_inflow_and_count(monthly):
+    months = monthly[monthly["InflowCount"].notna()]
 
-    grouped = (
-        df.groupby("MonthYear")
-        .agg(Total_Inflow=("Amount", "sum"), Transaction_Count=("Amount", "count"))
-        .reset_index()
-        .sort_values("MonthYear")
-    )
+    grouped = pd.DataFrame({
+        "MonthYear": months.index,
+        "Total_Inflow": months["InflowKobo"].to_numpy(dtype="int64") / KOBO_PER_NAIRA,
+        "Transaction_Count": months["InflowCount"].to_numpy(dtype="int64"),
+    })
 
     grouped["Date_Str"] = grouped["MonthYear"].dt.strftime("%b %Y")
 
@@ -259,19 +343,16 @@ def plot_monthly_inflow_and_count(df):
 
     return fig
 
-def plot_transfer_inflow_from_sender(df, top_n=20):
-
-    transfer_df = df[df["Description"].str.startswith("Transfer from", na=False)].copy()
-    transfer_df["Sender"] = transfer_df["Description"].str.replace(r"^Transfer from\s+", "", regex=True)
+def plot_transfer_inflow_from_sender(sender, top_n=20):
 
     grouped = (
-        transfer_df.groupby("Sender")["Amount"]
-        .agg(["sum", "count"])
+        sender.groupby("Sender")
+        .agg(**{"Total Sent": ("TotalKobo", "sum"), "Transaction Count": ("Count", "sum")})
         .reset_index()
-        .rename(columns={"sum": "Total Sent", "count": "Transaction Count"})
         .sort_values(by="Total Sent", ascending=False)
         .head(top_n)
     )
+    grouped["Total Sent"] /= KOBO_PER_NAIRA
 
     fig = px.bar(
         grouped,
@@ -306,12 +387,14 @@ def plot_transfer_inflow_from_sender(df, top_n=20):
 
 
 
-def plot_top_outflow_categories(df, top_n=10):
-    df = df.query("Type == 'Debit'")
+def plot_top_outflow_categories(type_category, top_n=10):
+    debits = type_category[type_category["Type"] == "Debit"]
     
     grouped = (
-        df.groupby("Category")["Amount"]
+        debits.groupby("Category", observed=True)["TotalKobo"]
         .sum()
+        .div(KOBO_PER_NAIRA)
+        .rename("Amount")
         .reset_index()
         .sort_values(by="Amount", ascending=False)
     )
@@ -351,18 +434,15 @@ def plot_top_outflow_categories(df, top_n=10):
     return fig
 
 # Outgoing Transfer Recipients Plot
-def plot_transfer_to_recipients(df, top_n=20):
-    transfer_df = df[df["Description"].str.startswith("Transfer to", na=False)].copy()
-    transfer_df["Recipient"] = transfer_df["Description"].str.replace(r"^Transfer to\s+", "", regex=True)
-
+def plot_transfer_to_recipients(recipient, top_n=20):
     grouped = (
-        transfer_df.groupby("Recipient")["Amount"]
-        .agg(["sum", "count"])
+        recipient.groupby("Recipient")
+        .agg(**{"Total Sent": ("TotalKobo", "sum"), "Transaction Count": ("Count", "sum")})
         .reset_index()
-        .rename(columns={"sum": "Total Sent", "count": "Transaction Count"})
         .sort_values(by="Total Sent", ascending=False)
         .head(top_n)
     )
+    grouped["Total Sent"] /= KOBO_PER_NAIRA
 
     fig = px.bar(
         grouped,
@@ -393,17 +473,17 @@ def plot_transfer_to_recipients(df, top_n=20):
     return fig
 
 # Spending By Channel
-def plot_spending_by_channel(df):
+def plot_spending_by_channel(type_channel):
 
-    debit_df = df[df["Type"] == "Debit"]
+    debits = type_channel[type_channel["Type"] == "Debit"]
     
     grouped = (
-        debit_df.groupby("Channel")["Amount"]
-        .agg(["sum", "count"])
+        debits.groupby("Channel", observed=True)
+        .agg(**{"Total Amount": ("TotalKobo", "sum"), "Number of Transactions": ("Count", "sum")})
         .reset_index()
-        .rename(columns={"sum": "Total Amount", "count": "Number of Transactions"})
         .sort_values(by="Total Amount", ascending=False)
     )
+    grouped["Total Amount"] /= KOBO_PER_NAIRA
     
     fig = px.bar(
         grouped,
@@ -432,15 +512,14 @@ def plot_spending_by_channel(df):
 
 
 # Monthly Spending and Transaction Count
-def plot_monthly_outflow_and_count(df):
-    df = df[df["Type"] == "Debit"]
+def plot_monthly_outflow_and_count(monthly):
+    months = monthly[monthly["OutflowCount"].notna()]
 
-    grouped = (
-        df.groupby("MonthYear")
-        .agg(Total_Outflow=("Amount", "sum"), Transaction_Count=("Amount", "count"))
-        .reset_index()
-        .sort_values("MonthYear")
-    )
+    grouped = pd.DataFrame({
+        "MonthYear": months.index,
+        "Total_Outflow": months["OutflowKobo"].to_numpy(dtype="int64") / KOBO_PER_NAIRA,
+        "Transaction_Count": months["OutflowCount"].to_numpy(dtype="int64"),
+    })
 
     grouped["Date_Str"] = grouped["MonthYear"].dt.strftime("%b %Y")
 
@@ -481,14 +560,28 @@ def plot_monthly_outflow_and_count(df):
 
 
 # Balanace Trend
-def balance_trend_chart(df):
+def balance_trend_chart(daily_balance, width_px=BALANCE_CHART_WIDTH_PX):
     daily_balance = (
-        df.groupby("Date")["Balance"]
+        daily_balance.groupby("Date")["MaxBalanceKobo"]
         .max()
+        .div(KOBO_PER_NAIRA)
+        .rename("Balance")
         .reset_index()
         .sort_values("Date")
     )
 
+    # Too many days for the chart's width: bin them, keeping each bin's highest balance
+    max_bars = width_px // MIN_BAR_PX
+    if len(daily_balance) > max_bars:
+        span_days = (daily_balance["Date"].iloc[-1] - daily_balance["Date"].iloc[0]).days + 1
+        bin_days = -(-span_days // max_bars)
+        daily_balance = (
+            daily_balance.groupby(pd.Grouper(key="Date", freq=f"{bin_days}D"))["Balance"]
+            .max()
+            .dropna()
+            .reset_index()
+        )
+
     fig = px.bar(
         daily_balance,
         x="Date",
@@ -511,10 +604,15 @@ def balance_trend_chart(df):
 
 
 # Sparkline under cards in Overview
-def create_sparkline(df, y_col, line_color):
+def create_sparkline(df, y_col, line_color, width_px=SPARKLINE_WIDTH_PX):
+    points = df[['Date', y_col]]
+    if len(points) > width_px:
+        points = points.dropna()
+        points = points.iloc[lttb_indices(points['Date'].to_numpy().astype(np.int64), points[y_col], width_px)]
+
     fig = go.Figure(go.Scatter(
-        x=df['Date'],
-        y=df[y_col],
+        x=points['Date'],
+        y=points[y_col],
         mode='lines',
         line=dict(color=line_color, width=2),
         hovertemplate=f"<b>Date:</b> %{{x|%b %d, %Y}}<br><b>{y_col}:</b> ₦%{{y:,.2f}}<extra></extra>"
@@ -0,0 +1,78 @@
+import numpy as np
+
+
+class QuantileSketch:
+    """Mergeable KLL quantile sketch over a stream of floats.
+
+    Holds O(k) values however many have been added. Until the first
+    compaction it keeps every value and answers quantiles exactly, with the
+    same linear interpolation as pandas; afterwards answers are within a
+    rank error of roughly 1.7 / k.
+    """
+
+    def __init__(self, k=2048, seed=0):
+        self.k = k
+        self.count = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def exact(self):
+        return len(self.levels) == 1
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self.count += len(values)
+        self._compress()
+
+    def merge(self, other):
+        for height, items in enumerate(other.levels):
+            if height == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[height] = np.concatenate([self.levels[height], items])
+        self.count += other.count
+        self._compress()
+
+    def copy(self):
+        sketch = QuantileSketch(self.k)
+        sketch.count = self.count
+        sketch.levels = [items.copy() for items in self.levels]
+        sketch._rng = np.random.default_rng(self._rng.integers(2 ** 63))
+        return sketch
+
+    def _capacity(self, height):
+        # Levels further below the top keep geometrically fewer items
+        depth = len(self.levels) - height - 1
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        height = 0
+        while height < len(self.levels):
+            items = self.levels[height]
+            if len(items) > self._capacity(height):
+                items = np.sort(items)
+                # An odd item out stays behind; every other one of the rest moves up a level
+                keep, items = items[len(items) - len(items) % 2:], items[:len(items) - len(items) % 2]
+                if height + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                promoted = items[self._rng.integers(2)::2]
+                self.levels[height + 1] = np.concatenate([self.levels[height + 1], promoted])
+                self.levels[height] = keep
+            height += 1
+
+    def quantile(self, q):
+        if self.count == 0:
+            return np.nan
+        if self.exact:
+            return float(np.quantile(self.levels[0], q))
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2 ** h) for h, items in enumerate(self.levels)])
+        order = np.argsort(values, kind="stable")
+        ranks = np.cumsum(weights[order])
+        position = min(np.searchsorted(ranks, q * ranks[-1], side="left"), len(values) - 1)
+        return float(values[order][position])
@@ -0,0 +1,460 @@
+import hashlib
+import re
+from collections import deque
+from datetime import datetime
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+from aggregates import DateRanges, build_monthly, build_rollups
+from cache import LRUCache
+from distinct import per_distinct
+from extraction import iter_page_lines, iter_page_texts
+from store import statement_store
+
+OPAY_NOTE = "Note: Current Balance includes OWealth Balance which is powered by Blue Ridge Microfinance Bank, and OPay Wallet Balance."
+
+# Parsed statements kept in memory, keyed by the SHA-256 of the uploaded PDF
+STATEMENT_CACHE_MAX_BYTES = 512 * 1024 * 1024
+_statement_cache = LRUCache(STATEMENT_CACHE_MAX_BYTES)
+
+category_mappings = {
+    "Mobile Data & Airtime": ["Mobile Data", "Airtime"],
+    "Card Payments": ["OPay Card Payment"],
+    "USSD Deposits": ["Add Money Bank USSD"],
+    "Bank Deposits": ["Bank Deposit", "^Transfer from(?! EaseMoni)"],
+    "Outgoing Transfers": ["^Transfer to"],
+    "TV Subscriptions": ["TV"],
+    "Electricity Bills": ["Electricity"],
+    "ATM": ["^ATM"],
+    "POS Transactions": ["^POS"],
+    "Loan Repayment": ["MerchantLoan repayment", "EaseMoni loan repayment"],
+    "OWealth Deposits": ["OWealth Deposit", "OWealth Deposit(AutoSave)", "OWealth Deposit(from Fixed)"],
+    "Fixed Deposits": ["Fixed Deposit"],
+    "OPay Card Rewards": ["Apply OPay Physical Card"],
+    "Online Payments": ["^Transfer to Paystack", "Merchant Consumption"],
+    "Others": ["Other", "Certpay"],
+    "Refunds": ["Refund"],
+    "Betting": ["Betting"],
+    "USSD Charges": ["USSD Charge"],
+    "EaseMoni Loans": ["Transfer from EaseMoni"],
+    "OWealth Interest": ["OWealth Interest Earned"],
+    "Electronic Money Levy": ["Electronic Money Transfer Levy"]
+}
+
+def _compile_category_matcher(mappings):
+    """Fold category_mappings into one alternation regex, in priority order.
+
+    The regex is matched at the start of the lowercased description; Python
+    tries alternatives left to right, so the first one that matches is the
+    same category the keyword-by-keyword scan would pick. Keywords starting
+    with "^" must start the description, all others may appear anywhere.
+    """
+    alternatives = []
+    group_categories = {}
+    for i, (category, keywords) in enumerate(mappings.items()):
+        patterns = []
+        for keyword in keywords:
+            if keyword.startswith("^"):
+                patterns.append(re.escape(keyword[1:].lower()))
+            else:
+                patterns.append(".*?" + re.escape(keyword.lower()))
+        group = f"c{i}"
+        alternatives.append(f"(?P<{group}>{'|'.join(patterns)})")
+        group_categories[group] = category
+    return re.compile("|".join(alternatives), re.DOTALL), group_categories
+
+_category_pattern, _category_groups = _compile_category_matcher(category_mappings)
+
+def categorize_description(description):
+    if not isinstance(description, str):
+        return "Others"
+
+    match = _category_pattern.match(description.lower())
+    return _category_groups[match.lastgroup] if match else "Others"
+
+def categorize_descriptions(descriptions):
+    """categorize_description over a Series, matching each distinct description once."""
+    categories = per_distinct(
+        descriptions, lambda uniques: np.array([categorize_description(val) for val in uniques], dtype=object), "Others"
+    )
+    return pd.Series(categories, index=descriptions.index)
+
+TRANSACTION_COLUMNS = [
+    'Trans Time',
+    'Date',
+    'Description',
+    'Amount',
+    'Balance',
+    'Channel',
+    'Reference'
+]
+
+# Whole-line patterns; the date shape is a cheap superset of what
+# datetime.strptime(val, "%d %b %Y") accepts.
+_VALUE_DATE_LINE = re.compile(r"\d{1,2}\s+\S+\s+\d{4}")
+_AMOUNT_LINE = re.compile(r"[+-].*\.\d{2}")
+
+def _is_value_date(val):
+    try:
+        datetime.strptime(val, "%d %b %Y")
+    except ValueError:
+        return False
+    return True
+
+def _next_true(mask):
+    """Index of the first True at or after each position, len(mask) when there is none.
+
+    Padded with a few sentinels so lookups just past the end stay in range.
+    """
+    n = len(mask)
+    positions = np.where(mask, np.arange(n), n)
+    following = np.minimum.accumulate(positions[::-1])[::-1]
+    return np.append(following, [n] * 4).tolist()
+
+# Function to parse data to DataFrame
+def parse_data(data):
+    """Reshape the one-field-per-line transaction table into a DataFrame.
+
+    After a 7-line header, every transaction is 7 fields: Trans Time, Value
+    Date, Description, Amount, Balance, Channel and Reference. Lines that don't
+    fit a field are fragments of the row being read: 2-digit lines are the
+    seconds of a split time, and non-dates where the Value Date belongs or
+    non-amounts where the Amount belongs are wrapped Description text.
+    Fragments of 2 characters are appended to Trans Time, all others to
+    Description.
+    """
+    lines = np.array([val.strip() for val in islice(data, 7, None)], dtype=object)
+    lengths = np.fromiter(map(len, lines), dtype=np.int64, count=len(lines))
+
+    # Split seconds never take a field, wherever they appear
+    fragment = lengths == 2
+    fragment[fragment] = [val.isdigit() for val in lines[fragment]]
+    field_lines = np.flatnonzero(~fragment)
+    values = lines[field_lines]
+    n = len(values)
+
+    # Classify the field lines in place, without joining them into one text
+    field_values = pd.Series(values, dtype=object)
+    # strptime only runs on the distinct date-shaped values
+    is_date = np.array(field_values.str.fullmatch(_VALUE_DATE_LINE), dtype=bool)
+    date_like = values[is_date]
+    valid_dates = {val: _is_value_date(val) for val in set(date_like)}
+    is_date[is_date] = [valid_dates[val] for val in date_like]
+    is_amount = field_values.str.fullmatch(_AMOUNT_LINE).to_numpy(dtype=bool)
+
+    # Walk row by row: Value Date is the first date after Trans Time, Amount the
+    # first amount after Description, and the remaining fields follow in order
+    next_date = _next_true(is_date)
+    next_amount = _next_true(is_amount)
+    row_starts, date_slots, amount_slots = [], [], []
+    pos = 0
+    while pos < n:
+        date_slot = next_date[pos + 1]
+        amount_slot = next_amount[date_slot + 2]
+        row_starts.append(pos)
+        date_slots.append(date_slot)
+        amount_slots.append(amount_slot)
+        pos = amount_slot + 4
+
+    date_slots = np.array(date_slots, dtype=np.int64)
+    amount_slots = np.array(amount_slots, dtype=np.int64)
+    slots = np.column_stack([
+        np.array(row_starts, dtype=np.int64),
+        date_slots,
+        date_slots + 1,
+        amount_slots,
+        amount_slots + 1,
+        amount_slots + 2,
+        amount_slots + 3,
+    ])
+    filled = slots < n
+
+    columns = {}
+    for i, name in enumerate(TRANSACTION_COLUMNS):
+        column = np.full(len(slots), None, dtype=object)
+        column[filled[:, i]] = values[slots[filled[:, i], i]]
+        columns[name] = column
+
+    # Everything that didn't land in a field belongs to the row being read at the time
+    in_field = np.zeros(n, dtype=bool)
+    in_field[slots[filled]] = True
+    fix_lines = np.sort(np.concatenate([np.flatnonzero(fragment), field_lines[~in_field]]))
+    row_ends = field_lines[slots[filled[:, 6], 6]]
+    fix_rows = np.searchsorted(row_ends, fix_lines)
+    fix_values = lines[fix_lines]
+    in_range = fix_rows < len(slots)
+    fix_lines, fix_rows, fix_values = fix_lines[in_range], fix_rows[in_range], fix_values[in_range]
+
+    to_time = lengths[fix_lines] == 2
+    for name, target in (('Trans Time', to_time), ('Description', ~to_time)):
+        rows, pieces = fix_rows[target], fix_values[target]
+        if not len(rows):
+            continue
+        # Fragments of the same row are concatenated in reading order
+        first = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+        rows, pieces = rows[first], np.add.reduceat(pieces, first)
+        column = columns[name]
+        present = np.array([val is not None for val in column[rows]], dtype=bool)
+        column[rows[present]] = column[rows[present]] + pieces[present]
+
+    return pd.DataFrame({name: column.tolist() for name, column in columns.items()})
+
+# Compact column types for the cleaned transaction frame: categoricals for the
+# low-cardinality text columns and the smallest ints that hold calendar fields
+CATEGORICAL_COLUMNS = [
+    "Description",
+    "Category",
+    "Main Category",
+    "Channel",
+    "Type",
+    "Label",
+    "Month",
+    "Recipient",
+    "Sender"
+]
+INTEGER_COLUMNS = {
+    "Year": "int16",
+    "Hour": "int8",
+    "Day": "int8",
+    "Weekday": "int8",
+    "IsWeekend": "int8"
+}
+
+def apply_schema(df):
+    """Cast a cleaned transaction frame to the compact schema, in place.
+
+    Concatenating frames whose categoricals differ falls back to plain strings,
+    so this is reapplied after joining the wallet and OWealth frames.
+    """
+    for column in CATEGORICAL_COLUMNS:
+        if column in df and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype("category")
+    for column, dtype in INTEGER_COLUMNS.items():
+        if column in df:
+            df[column] = df[column].astype(dtype)
+    return df
+
+# Sign, naira and kobo digits of a money string once separators are removed
+_MONEY_PATTERN = r"^([+-]?)(\d+)(?:\.(\d{1,2}))?$"
+
+def parse_kobo(text):
+    """Parse money text such as "+1,234.56" into exact signed int64 kobo.
+
+    Returns the kobo and a mask of the values that parsed. Missing or
+    malformed text comes back as 0 kobo and is marked invalid.
+    """
+    parts = text.str.replace(r"[, ]", "", regex=True).str.extract(_MONEY_PATTERN)
+    valid = parts[1].notna().to_numpy()
+    naira = parts[1][valid].astype("int64").to_numpy()
+    kobo = parts[2][valid].fillna("").str.ljust(2, "0").astype("int64").to_numpy()
+    magnitude = np.zeros(len(text), dtype=np.int64)
+    magnitude[valid] = naira * 100 + kobo
+    return np.where((parts[0] == "-").to_numpy(), -magnitude, magnitude), valid
+
+# Counterparty of a bank transfer: group 1 is the direction, group 2 the name
+TRANSFER_PATTERN = r"^Transfer (to|from)\s+(.*)"
+
+def clean_dataframes(df):
+    # ATM and POS rows are relabelled below, so they survive the withdrawal filter
+    card = df['Channel'].isin(['ATM', 'POS'])
+    df = df[(df['Description'] != 'OWealth Withdrawal') | card].copy()
+    card = card.loc[df.index].to_numpy()
+
+    df['Trans Time'] = pd.to_datetime(df['Trans Time'])
+    df['Date'] = pd.to_datetime(df['Date'])
+    debit = df['Amount'].str.startswith("-", na=False).to_numpy()
+    df["Type"] = np.where(debit, "Debit", "Credit")
+    # Money is kept as exact integer kobo; the float columns are for display
+    amount_kobo, amount_valid = parse_kobo(df['Amount'])
+    balance_kobo, balance_valid = parse_kobo(df['Balance'].fillna("0"))
+    balance_kobo = np.abs(balance_kobo)
+    df['Amount'] = np.where(amount_valid, np.abs(amount_kobo) / 100, np.nan)
+    df['Balance'] = np.where(balance_valid, balance_kobo / 100, np.nan)
+    df["Year"] = df["Trans Time"].dt.year
+    df["Month"] = df["Trans Time"].dt.month_name()
+    df["MonthYear"] = df["Trans Time"].dt.to_period("M")
+
+    # One extraction serves the categories and both counterparty columns. It
+    # runs once per distinct description; missing ones (code -1) reindex to NaN.
+    codes, uniques = pd.factorize(df["Description"])
+    transfer = pd.Series(uniques).str.extract(TRANSFER_PATTERN).reindex(codes)
+    transfer.index = df.index
+    outgoing = (transfer[0] == "to").to_numpy(dtype=bool)
+    received = (transfer[0] == "from").to_numpy(dtype=bool)
+    df["Category"] = df["Description"].mask(outgoing, "Outgoing Bank Transfers").mask(received, "Received Bank Transfers")
+
+    df['Description'] = df['Description'].mask(card, df['Channel'])
+
+    df["Main Category"] = categorize_descriptions(df["Description"])
+
+    df["Recipient"] = transfer[1].where(outgoing & ~card)
+    df["Sender"] = transfer[1].where(received & ~card)
+
+    df["Inflow"] = np.where(debit, 0.0, df["Amount"])
+    df["Outflow"] = np.where(debit, df["Amount"], 0.0)
+    df["AmountKobo"] = amount_kobo
+    df["BalanceKobo"] = balance_kobo
+
+    df['Hour'] = df['Trans Time'].dt.hour
+    df['Day'] = df['Trans Time'].dt.day
+    df['Weekday'] = df['Trans Time'].dt.weekday
+    df['IsWeekend'] = df['Weekday'].isin([5, 6])
+
+    return apply_schema(df)
+
+def to_naira(kobo):
+    return kobo / 100
+
+def statement_hash(file_bytes):
+    return hashlib.sha256(file_bytes).hexdigest()
+
+class OpayStatementReader:
+    """Single pass over the lines of an OPay statement, split into its sections.
+
+    Sections must be consumed in order: ``read_header()``, then ``wallet_lines()``,
+    then ``owealth_lines()``. Both transaction sections are generators that can be
+    fed straight into ``parse_data``.
+    """
+
+    OWEALTH_SUMMARY = "Summary - OWealth Balance"
+    WALLET_SUMMARY = "Summary - Wallet Balance"
+    # Lines between the end of the wallet table and the OWealth summary marker
+    OWEALTH_INFO_LINES = 10
+    # Footer lines at the very end of the statement
+    FOOTER_LINES = 2
+
+    def __init__(self, lines):
+        self._lines = iter(lines)
+        self.wallet_info = None
+        self.owealth_info = None
+        self.has_wallet_summary = False
+        self._pending = None
+
+    def _next_lines(self):
+        for line in self._lines:
+            if line == self.WALLET_SUMMARY:
+                self.has_wallet_summary = True
+            yield line
+
+    def read_header(self):
+        """Read the account details up to the OPay note. Returns False if there is no note."""
+        header = []
+        for line in self._next_lines():
+            if line == OPAY_NOTE:
+                header.remove('Account Statement')
+                self.wallet_info = dict(zip(header[::2], header[1::2]))
+                return True
+            header.append(line)
+        return False
+
+    def wallet_lines(self):
+        lines = self._next_lines()
+        for line in lines:
+            if line == "Trans. Time":
+                break
+        else:
+            return
+
+        # Hold back the lines that turn out to be the OWealth info block
+        held = deque([line])
+        for line in lines:
+            if line == self.OWEALTH_SUMMARY:
+                self.owealth_info = list(held)[-self.OWEALTH_INFO_LINES:]
+                break
+            held.append(line)
+            if len(held) > self.OWEALTH_INFO_LINES:
+                yield held.popleft()
+        else:
+            yield from held
+
+    def has_owealth(self):
+        """Whether the statement carries an OWealth section, known once the wallet is read."""
+        if self.owealth_info is None:
+            return False
+        if not self.has_wallet_summary:
+            # The wallet summary marker can only be found further down; buffer the rest
+            self._pending = list(self._next_lines())
+        return self.has_wallet_summary
+
+    def owealth_lines(self):
+        lines = self._next_lines() if self._pending is None else iter(self._pending)
+        held = deque()
+        for line in lines:
+            held.append(line)
+            if len(held) > self.FOOTER_LINES:
+                yield held.popleft()
+
+def _parse_opay_statement(file_bytes):
+    reader = OpayStatementReader(iter_page_lines(iter_page_texts(file_bytes)))
+    if not reader.read_header():
+        return None
+
+    wallet_df = parse_data(reader.wallet_lines())
+    wallet_df = clean_dataframes(wallet_df)
+    wallet_df["Label"] = ["Wallet"] * len(wallet_df)
+    apply_schema(wallet_df)
+    frames = {"wallet_df": wallet_df}
+    owealth_info = None
+
+    if reader.has_owealth():
+        owealth_df = parse_data(reader.owealth_lines())
+        owealth_df = clean_dataframes(owealth_df)
+        owealth_df["Label"] = ["Owealth"] * len(owealth_df)
+        frames["owealth_df"] = apply_schema(owealth_df)
+        owealth_info = reader.owealth_info
+
+    return {"wallet_info": reader.wallet_info, "owealth_info": owealth_info}, frames
+
+def _assemble_statement(info, frames):
+    wallet_df = frames["wallet_df"]
+    owealth_df = frames.get("owealth_df")
+    df = wallet_df
+    if owealth_df is not None:
+        df = apply_schema(pd.concat([wallet_df, owealth_df], ignore_index=True))
+    df = df.sort_values("Trans Time")
+
+    rollups = build_rollups(df)
+    return {
+        "wallet_info": info["wallet_info"],
+        "owealth_info": info["owealth_info"],
+        "wallet_df": wallet_df,
+        "owealth_df": owealth_df,
+        "df": df,
+        # Small totals every chart is answered from
+        "rollups": rollups,
+        # Month-by-month totals for the monthly charts and averages
+        "monthly": build_monthly(rollups["type_month"], df),
+        # Date-range totals and slices for the inSight Model page
+        "date_ranges": DateRanges(df),
+    }
+
+def _process_opay_statement(file_hash, file_bytes):
+    stored = statement_store.get(file_hash) if statement_store is not None else None
+    if stored is not None:
+        return _assemble_statement(*stored)
+
+    parsed = _parse_opay_statement(file_bytes)
+    if parsed is None:
+        return None
+    if statement_store is not None:
+        statement_store.put(file_hash, *parsed)
+    return _assemble_statement(*parsed)
+
+def process_statement(file_hash, file_bytes):
+    """Extract -> parse -> clean for an OPay PDF, memoised by content hash.
+
+    Returns None when the PDF is not an OPay statement. A rerun with the same
+    statement is a dictionary lookup; the cache is LRU-evicted once the parsed
+    frames exceed STATEMENT_CACHE_MAX_BYTES. When the local statement store is
+    enabled, a statement seen by an earlier session is reloaded from disk
+    instead of being parsed again.
+    """
+    return _statement_cache.get_or_create(file_hash, lambda: _process_opay_statement(file_hash, file_bytes))
+
+def forget_statements():
+    """Drop every parsed statement from memory and from the local store."""
+    _statement_cache.clear()
+    if statement_store is not None:
+        statement_store.purge()
@@ -0,0 +1,112 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+import pyarrow as pa
+
+# Parsed statements are only written to disk when this directory is configured
+STORE_DIR = os.environ.get("FINSIGHT_STORE_DIR")
+STORE_MAX_BYTES = int(os.environ.get("FINSIGHT_STORE_MAX_BYTES", 1024 * 1024 * 1024))
+
+META_FILE = "meta.json"
+
+# Bump when the cleaned frames change shape, so entries written by an older
+# clean_dataframes are parsed again rather than reloaded
+STORE_VERSION = 1
+
+
+def _write_frame(df, path):
+    table = pa.Table.from_pandas(df)
+    with pa.OSFile(str(path), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def _read_frame(path):
+    # Columns are memory-mapped rather than read into a separate buffer first
+    with pa.memory_map(str(path)) as source:
+        return pa.ipc.open_file(source).read_all().to_pandas()
+
+
+def _dir_size(path):
+    return sum(f.stat().st_size for f in path.iterdir())
+
+
+class StatementStore:
+    """Local store of parsed statements, one directory per content hash.
+
+    Each entry holds the cleaned frames as Arrow IPC files plus the header
+    dicts as JSON. Entries are LRU-evicted once the store exceeds
+    ``max_bytes``; reading an entry marks it as recently used.
+    """
+
+    def __init__(self, root, max_bytes=STORE_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _entry(self, key):
+        return self.root / key
+
+    def _entries(self):
+        return [p for p in self.root.iterdir() if (p / META_FILE).exists()]
+
+    def __contains__(self, key):
+        return (self._entry(key) / META_FILE).exists()
+
+    def get(self, key):
+        """Return ``(meta, frames)`` for a stored statement, or None if missing or from another STORE_VERSION."""
+        entry = self._entry(key)
+        try:
+            meta = json.loads((entry / META_FILE).read_text())
+            if meta.get("version") != STORE_VERSION:
+                return None
+            frames = {name: _read_frame(entry / f"{name}.arrow") for name in meta["frames"]}
+            os.utime(entry / META_FILE)
+        except (OSError, ValueError, pa.ArrowException):
+            return None
+        return meta["info"], frames
+
+    def put(self, key, info, frames):
+        """Store the header dicts ``info`` and the named DataFrames ``frames``."""
+        tmp = Path(tempfile.mkdtemp(dir=self.root, prefix=".tmp-"))
+        try:
+            for name, df in frames.items():
+                _write_frame(df, tmp / f"{name}.arrow")
+            (tmp / META_FILE).write_text(json.dumps({"version": STORE_VERSION, "info": info, "frames": list(frames)}))
+            with self._lock:
+                entry = self._entry(key)
+                if entry.exists():
+                    shutil.rmtree(entry)
+                # Readers only ever see a complete entry
+                os.replace(tmp, entry)
+                self._evict()
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def _evict(self):
+        entries = sorted(self._entries(), key=lambda p: (p / META_FILE).stat().st_mtime)
+        sizes = {p: _dir_size(p) for p in entries}
+        total = sum(sizes.values())
+        for entry in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= sizes[entry]
+
+    @property
+    def nbytes(self):
+        return sum(_dir_size(p) for p in self._entries())
+
+    def purge(self):
+        """Delete every stored statement."""
+        with self._lock:
+            for entry in self.root.iterdir():
+                shutil.rmtree(entry, ignore_errors=True)
+
+
+statement_store = StatementStore(STORE_DIR) if STORE_DIR else None